@@ -0,0 +1,70 @@
+"""Micro-benchmark: decode 10k customer and policy rows into models.
+
+Compares the validated construction the DAO layer used to do per row with
+the shared RowDecoder. Run from the repository root:
+
+    python -m bench.decode_rows
+"""
+import argparse
+import timeit
+from datetime import date, timedelta
+from model import Customer, Policy
+from data.money import from_cents
+from data.rows import CUSTOMER_ROW, POLICY_ROW
+
+
+def make_rows(count: int):
+    """Build rows shaped like the customers and policies SELECTs."""
+    base = date(2025, 1, 1)
+    customers = [
+        (i, f"Customer {i}", (date(1960, 1, 1) + timedelta(days=i % 15000)).isoformat(),
+         f"customer{i}@email.com", f"{i} Main St", "Texas")
+        for i in range(1, count + 1)
+    ]
+    policies = [
+        (i, i // 2 + 1, (base + timedelta(days=i % 365)).isoformat(),
+         (base + timedelta(days=i % 365 + 364)).isoformat(), "pet", 25000 + (i % 200) * 500)
+        for i in range(1, count + 1)
+    ]
+    return customers, policies
+
+
+def validated_customers(rows):
+    return [
+        Customer(id=row[0], name=row[1], date_of_birth=date.fromisoformat(row[2]),
+                 email=row[3], address=row[4], state=row[5])
+        for row in rows
+    ]
+
+
+def validated_policies(rows):
+    return [
+        Policy(id=row[0], customer_id=row[1], start_date=date.fromisoformat(row[2]),
+               end_date=date.fromisoformat(row[3]), product=row[4], premium=from_cents(row[5]))
+        for row in rows
+    ]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rows", type=int, default=10_000)
+    parser.add_argument("--repeat", type=int, default=7)
+    args = parser.parse_args()
+
+    customers, policies = make_rows(args.rows)
+    assert CUSTOMER_ROW.decode_all(customers) == validated_customers(customers)
+    assert POLICY_ROW.decode_all(policies) == validated_policies(policies)
+
+    cases = [
+        ("customers", lambda: validated_customers(customers), lambda: CUSTOMER_ROW.decode_all(customers)),
+        ("policies", lambda: validated_policies(policies), lambda: POLICY_ROW.decode_all(policies)),
+    ]
+    print(f"{'model':<10} {'validated ms':>13} {'RowDecoder ms':>14} {'speedup':>8}  (per {args.rows} rows, best of {args.repeat})")
+    for name, validated, decoded in cases:
+        before = min(timeit.repeat(validated, number=1, repeat=args.repeat)) * 1000
+        after = min(timeit.repeat(decoded, number=1, repeat=args.repeat)) * 1000
+        print(f"{name:<10} {before:>13.2f} {after:>14.2f} {before / after:>7.1f}x")
+
+
+if __name__ == "__main__":
+    main()
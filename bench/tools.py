@@ -0,0 +1,211 @@
+"""Benchmark the MCP tools at a configurable data size and concurrency.
+
+By default the tool coroutines in main.py are called in-process against a
+generated database. With --sse the same calls go through a running server's
+SSE transport instead, which adds protocol and serialisation cost.
+
+Run from the repository root:
+
+    python -m bench.tools --customers 100000 --concurrency 1,8,32 --output results.json
+    python -m bench.tools --sse http://localhost:8000/sse --customers 100000
+
+In SSE mode the server must already be serving a data set of the given size
+(e.g. started with SAMPLE_CUSTOMERS=100000); --customers is then only used to
+pick valid IDs.
+"""
+import argparse
+import asyncio
+import json
+import os
+import platform
+import random
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from typing import Awaitable, Callable, Dict, List, Tuple
+
+from data.generator import LAST_NAMES, STATES, STREETS, GeneratorSettings
+
+# tool name -> (coroutine name in main.py, argument factory)
+ArgumentFactory = Callable[[random.Random, GeneratorSettings], dict]
+TOOLS: Dict[str, Tuple[str, ArgumentFactory]] = {
+    "Get_all_customers": ("get_customers", lambda rng, size: {}),
+    "Get_customer_by_ID": ("get_customer", lambda rng, size: {"customer_id": rng.randint(1, size.customers)}),
+    "Get_customer_policies": ("get_customer_policies",
+                              lambda rng, size: {"customer_id": rng.randint(1, size.customers)}),
+    "Get_customer_in_state": ("get_customers_in_state", lambda rng, size: {"state": rng.choice(STATES)}),
+    "Search_customers": ("find_customers",
+                         lambda rng, size: {"query": f"{rng.choice(LAST_NAMES)} {rng.choice(STREETS).split()[0]}"}),
+    "Get_customer_overview": ("get_customer_summary",
+                              lambda rng, size: {"customer_id": rng.randint(1, size.customers)}),
+    "Calculate_total_customer_premium": ("get_customer_premium",
+                                         lambda rng, size: {"customer_id": rng.randint(1, size.customers)}),
+    "Calculate_days_until_policy_end": ("get_policy_days_to_end",
+                                        lambda rng, size: {"policy_id": rng.randint(
+                                            1, size.customers * size.policies_per_customer)}),
+    "Calculate_days_until_policies_end": ("get_policies_days_to_end",
+                                          lambda rng, size: {"policy_ids": [rng.randint(
+                                              1, size.customers * size.policies_per_customer) for _ in range(100)]}),
+    "Get_policies_expiring_within": ("get_expiring_policies", lambda rng, size: {"days": 30}),
+}
+
+Call = Callable[[str, dict], Awaitable[object]]
+
+
+def percentile(sorted_values: List[float], fraction: float) -> float:
+    """Nearest-rank percentile of an already sorted list."""
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, max(0, round(fraction * len(sorted_values)) - 1))
+    return sorted_values[index]
+
+
+async def run_level(call: Call, tool: str, make_arguments: ArgumentFactory, size: GeneratorSettings,
+                    concurrency: int, requests: int, seed: int) -> dict:
+    """Issue requests calls to tool from concurrency workers and summarise the latencies."""
+    rng = random.Random(seed)
+    arguments = [make_arguments(rng, size) for _ in range(requests)]
+    latencies: List[float] = []
+    errors = 0
+    next_request = 0
+
+    async def worker():
+        nonlocal errors, next_request
+        while next_request < requests:
+            args = arguments[next_request]
+            next_request += 1
+            started = time.perf_counter()
+            try:
+                await call(tool, args)
+            except Exception:
+                errors += 1
+            latencies.append(time.perf_counter() - started)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - started
+
+    latencies.sort()
+    return {
+        "tool": tool,
+        "concurrency": concurrency,
+        "requests": requests,
+        "errors": errors,
+        "throughput_rps": requests / elapsed if elapsed else 0.0,
+        "mean_ms": statistics.fmean(latencies) * 1000,
+        "p50_ms": percentile(latencies, 0.50) * 1000,
+        "p95_ms": percentile(latencies, 0.95) * 1000,
+        "p99_ms": percentile(latencies, 0.99) * 1000,
+    }
+
+
+async def run(call: Call, args, size: GeneratorSettings, reset: Callable[[], None] = lambda: None) -> List[dict]:
+    """Benchmark each tool at each concurrency level.
+
+    Every level gets its own argument sequence, and reset() runs before it,
+    so a level is not served from what an earlier level left in a cache.
+    """
+    results = []
+    for tool in args.tools:
+        _, make_arguments = TOOLS[tool]
+        # Warm prepared statements before measuring.
+        await run_level(call, tool, make_arguments, size, 1, args.warmup, args.seed)
+        for level, concurrency in enumerate(args.concurrency, 1):
+            reset()
+            result = await run_level(call, tool, make_arguments, size, concurrency, args.requests,
+                                     args.seed + level)
+            results.append(result)
+            print(f"{tool:<34} c={concurrency:<4} {result['throughput_rps']:>9.1f} req/s  "
+                  f"p50 {result['p50_ms']:>8.2f} ms  p95 {result['p95_ms']:>8.2f} ms  "
+                  f"p99 {result['p99_ms']:>8.2f} ms  errors {result['errors']}", flush=True)
+    return results
+
+
+async def run_in_process(args, size: GeneratorSettings) -> List[dict]:
+    import main
+    from data import util
+
+    util.DATABASE_PATH = args.database or os.path.join(tempfile.mkdtemp(prefix="insurance-bench-"), "bench.db")
+    util.configure_sample_data(size)
+    started = time.perf_counter()
+    await main.startup()
+    print(f"Loaded {size.customers} customers into {util.DATABASE_PATH} in {time.perf_counter() - started:.1f}s")
+
+    async def call(tool: str, arguments: dict):
+        return await getattr(main, TOOLS[tool][0])(**arguments)
+
+    try:
+        return await run(call, args, size, util.clear_entity_caches)
+    finally:
+        await util.close_database()
+
+
+async def run_over_sse(args, size: GeneratorSettings) -> List[dict]:
+    from mcp import ClientSession
+    from mcp.client.sse import sse_client
+
+    async with sse_client(args.sse) as (read, write):
+        async with ClientSession(read, write) as session:
+            await session.initialize()
+
+            async def call(tool: str, arguments: dict):
+                result = await session.call_tool(tool, arguments)
+                if result.isError:
+                    raise RuntimeError(result.content)
+                return result
+
+            return await run(call, args, size)
+
+
+def git_revision() -> str:
+    try:
+        return subprocess.run(["git", "rev-parse", "HEAD"], capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--customers", type=int, default=10000, help="customers in the data set (default 10000)")
+    parser.add_argument("--policies-per-customer", type=int, default=2)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--concurrency", default="1,8,32",
+                        help="comma-separated concurrency levels (default 1,8,32)")
+    parser.add_argument("--requests", type=int, default=500, help="calls per tool and level (default 500)")
+    parser.add_argument("--warmup", type=int, default=20, help="unmeasured calls per tool (default 20)")
+    parser.add_argument("--tools", default=",".join(TOOLS), help="comma-separated tool names (default all)")
+    parser.add_argument("--database", help="SQLite file to generate into (default a temporary file)")
+    parser.add_argument("--sse", metavar="URL", help="benchmark a running server over SSE, e.g. http://localhost:8000/sse")
+    parser.add_argument("--output", help="write results as JSON to this file")
+    args = parser.parse_args()
+    args.concurrency = [int(level) for level in args.concurrency.split(",")]
+    args.tools = args.tools.split(",")
+    unknown = set(args.tools).difference(TOOLS)
+    if unknown:
+        parser.error(f"unknown tools: {', '.join(sorted(unknown))}")
+
+    size = GeneratorSettings(args.customers, args.policies_per_customer, args.seed)
+    runner = run_over_sse if args.sse else run_in_process
+    results = asyncio.run(runner(args, size))
+
+    if args.output:
+        report = {
+            "revision": git_revision(),
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+            "python": sys.version.split()[0],
+            "platform": platform.platform(),
+            "mode": "sse" if args.sse else "in-process",
+            "customers": size.customers,
+            "policies_per_customer": size.policies_per_customer,
+            "seed": size.seed,
+            "results": results,
+        }
+        with open(args.output, "w") as output:
+            json.dump(report, output, indent=2)
+        print(f"Wrote {args.output}")
+
+
+if __name__ == "__main__":
+    main()
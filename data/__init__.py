@@ -1,39 +1,137 @@
-from .util import init_database, init_sample_data, get_database, close_database, ensure_fresh_sample_data
+from .util import init_database, init_sample_data, configure_sample_data, configure_database, snapshot_database, prepare_database, restore_database, database_lock, open_database, get_database, write, run_exclusive, close_database, ensure_fresh_sample_data, iter_rows
+from .migrations import migrate, get_schema_version, rebuild_premium_summary, rebuild_customer_search, explain_query_plan, SCHEMA_VERSION
+from .generator import GeneratorSettings, bulk_load
+from .writer import Writer
+from .memory import MemoryDatabase
+from .transfer import ImportReport, read_records, import_customers, import_policies, export_customers, export_policies
+from .cache import EntityCache, configure_entity_caches, clear_entity_caches, entity_cache_stats
+from .rows import RowDecoder, Projection, CUSTOMER_ROW, POLICY_ROW
+from .admission import Overloaded, ConcurrencyLimit, Coalescer, configure_tool_admission, admit_tool
+from .metrics import configure_slow_query_log, instrument_tool, render_metrics, TOOL_CALL_SECONDS
 from .customer_db import (
     create_customer,
     get_customer_by_id,
+    get_customers_by_ids,
     get_customer_by_email,
+    search_customers,
+    get_customer_overview,
+    get_customer_total_premium,
+    CustomerOverview,
+    iter_customers,
+    get_customers_page,
+    get_customers_page_projection,
     get_all_customers,
     get_customers_by_state,
+    get_customers_by_state_projection,
     update_customer,
     delete_customer
 )
 from .policy_db import (
     create_policy,
     get_policy_by_id,
+    get_policies_by_ids,
+    iter_policies,
+    get_policies_page,
+    get_policies_page_projection,
     get_all_policies,
     get_policies_by_customer_id,
+    get_policies_by_customer_id_projection,
+    get_policies_by_customer_ids,
+    get_policies_expiring_within,
+    get_days_to_end_by_policy_ids,
+    get_total_premium_by_customer_id,
+    get_total_premium,
     update_policy,
     delete_policy
 )
+from .analytics_db import (
+    get_premium_summary_by_state,
+    get_premium_summary_by_product,
+    get_premium_summary_by_state_and_product
+)
 
 __all__ = [
     "init_database",
     "init_sample_data",
+    "configure_sample_data",
+    "configure_database",
+    "snapshot_database",
+    "prepare_database",
+    "restore_database",
+    "database_lock",
+    "open_database",
     "get_database", 
+    "write",
+    "run_exclusive",
     "close_database",
     "ensure_fresh_sample_data",
+    "iter_rows",
+    "migrate",
+    "get_schema_version",
+    "rebuild_premium_summary",
+    "rebuild_customer_search",
+    "explain_query_plan",
+    "SCHEMA_VERSION",
+    "GeneratorSettings",
+    "bulk_load",
+    "Writer",
+    "MemoryDatabase",
+    "ImportReport",
+    "read_records",
+    "import_customers",
+    "import_policies",
+    "export_customers",
+    "export_policies",
+    "EntityCache",
+    "configure_entity_caches",
+    "clear_entity_caches",
+    "entity_cache_stats",
+    "RowDecoder",
+    "Projection",
+    "CUSTOMER_ROW",
+    "POLICY_ROW",
+    "Overloaded",
+    "ConcurrencyLimit",
+    "Coalescer",
+    "configure_tool_admission",
+    "admit_tool",
+    "configure_slow_query_log",
+    "instrument_tool",
+    "render_metrics",
+    "TOOL_CALL_SECONDS",
     "create_customer",
     "get_customer_by_id",
+    "get_customers_by_ids",
     "get_customer_by_email", 
+    "search_customers",
+    "get_customer_overview",
+    "get_customer_total_premium",
+    "CustomerOverview",
+    "iter_customers",
+    "get_customers_page",
+    "get_customers_page_projection",
     "get_all_customers",
     "get_customers_by_state",
+    "get_customers_by_state_projection",
     "update_customer",
     "delete_customer",
     "create_policy",
     "get_policy_by_id",
+    "get_policies_by_ids",
+    "iter_policies",
+    "get_policies_page",
+    "get_policies_page_projection",
     "get_all_policies",
     "get_policies_by_customer_id",
+    "get_policies_by_customer_id_projection",
+    "get_policies_by_customer_ids",
+    "get_policies_expiring_within",
+    "get_days_to_end_by_policy_ids",
+    "get_total_premium_by_customer_id",
+    "get_total_premium",
     "update_policy",
-    "delete_policy"
+    "delete_policy",
+    "get_premium_summary_by_state",
+    "get_premium_summary_by_product",
+    "get_premium_summary_by_state_and_product"
 ]
\ No newline at end of file
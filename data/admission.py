@@ -0,0 +1,200 @@
+import asyncio
+import functools
+import json
+import time
+from collections import deque
+from typing import Any, Awaitable, Callable, Deque, Dict, Hashable, Optional, Tuple
+from .metrics import CallbackMetric, Counter, Histogram
+
+# Calls of one tool that run at once, and calls that may wait for a turn
+# before further calls are rejected. 0 means no limit.
+DEFAULT_CONCURRENCY = 32
+DEFAULT_MAX_WAITING = 64
+
+TOOL_COALESCED = Counter(
+    "insurance_tool_coalesced_total", "Tool calls answered by an identical call already in flight.", "tool")
+TOOL_REJECTED = Counter(
+    "insurance_tool_rejected_total", "Tool calls rejected because the tool's wait queue was full.", "tool")
+TOOL_QUEUE_SECONDS = Histogram(
+    "insurance_tool_queue_seconds", "Time tool calls waited for a concurrency slot.", "tool")
+
+
+class Overloaded(Exception):
+    """Raised instead of queueing a call when too many are already waiting."""
+
+
+class ConcurrencyLimit:
+    """Lets at most limit callers in at once, queueing up to max_waiting more in arrival order.
+
+    Callers beyond that are rejected with Overloaded straight away, so a
+    burst cannot build an unbounded backlog. A max_waiting of 0 or less
+    queues every caller.
+    """
+
+    def __init__(self, limit: int, max_waiting: int):
+        if limit < 1:
+            raise ValueError("limit must be at least 1")
+        self.limit = limit
+        self.max_waiting = max_waiting
+        self.running = 0
+        self._waiters: Deque[asyncio.Future] = deque()
+
+    @property
+    def waiting(self) -> int:
+        """Number of callers queued for a slot."""
+        return len(self._waiters)
+
+    async def acquire(self):
+        """Wait for a slot, or raise Overloaded if the queue is full."""
+        if self.running < self.limit and not self._waiters:
+            self.running += 1
+            return
+        if 0 < self.max_waiting <= len(self._waiters):
+            raise Overloaded(f"Too many concurrent calls ({self.running} running, {len(self._waiters)} waiting)")
+        future = asyncio.get_running_loop().create_future()
+        self._waiters.append(future)
+        try:
+            await future
+        except asyncio.CancelledError:
+            if future.cancelled():
+                self._waiters.remove(future)
+            else:
+                # The slot was handed over just as we were cancelled.
+                self.release()
+            raise
+
+    def release(self):
+        """Hand the slot to the next waiter, or free it."""
+        # The slot passes straight to the waiter, so running stays the same
+        # and a newcomer cannot take it first.
+        while self._waiters:
+            future = self._waiters.popleft()
+            if not future.done():
+                future.set_result(None)
+                return
+        self.running -= 1
+
+
+class Coalescer:
+    """Runs one call per key at a time; callers with the same key share its result."""
+
+    def __init__(self):
+        self._in_flight: Dict[Hashable, asyncio.Future] = {}
+
+    async def run(self, key: Hashable, call: Callable[[], Awaitable[Any]]) -> Tuple[Any, bool]:
+        """Return (result, shared): the result of call(), or of the identical call already running under key."""
+        future = self._in_flight.get(key)
+        shared = future is not None
+        if not shared:
+            future = asyncio.ensure_future(call())
+            self._in_flight[key] = future
+            future.add_done_callback(functools.partial(self._finished, key))
+        # One caller giving up must not cancel the call for the others.
+        return await asyncio.shield(future), shared
+
+    def _finished(self, key: Hashable, future: asyncio.Future):
+        if self._in_flight.get(key) is future:
+            del self._in_flight[key]
+        if not future.cancelled():
+            # Mark the exception retrieved in case every caller was cancelled.
+            future.exception()
+
+
+class ToolAdmission:
+    """Coalesces identical concurrent tool calls and applies each tool's concurrency limit."""
+
+    def __init__(self, concurrency: int = DEFAULT_CONCURRENCY, max_waiting: int = DEFAULT_MAX_WAITING):
+        self._coalescer = Coalescer()
+        # Built on each tool's first call, so configure() can run after the
+        # tools are registered.
+        self._limits: Dict[str, Optional[ConcurrencyLimit]] = {}
+        self.configure(concurrency, max_waiting)
+
+    def configure(self, concurrency: int = DEFAULT_CONCURRENCY, max_waiting: int = DEFAULT_MAX_WAITING,
+                  limits: Optional[Dict[str, int]] = None):
+        """Set the default concurrency and queue length, and per-tool concurrency overrides.
+
+        Call this before serving; limits already in use are replaced.
+        """
+        self.concurrency = concurrency
+        self.max_waiting = max_waiting
+        self.limits = dict(limits or {})
+        self._limits.clear()
+
+    def limit(self, name: str) -> Optional[ConcurrencyLimit]:
+        """Return the concurrency limit of tool name, or None if it is unlimited."""
+        if name not in self._limits:
+            concurrency = self.limits.get(name, self.concurrency)
+            self._limits[name] = ConcurrencyLimit(concurrency, self.max_waiting) if concurrency > 0 else None
+        return self._limits[name]
+
+    def wrap(self, name: str, fn: Callable[..., Awaitable[Any]], coalesce: bool = True):
+        """Wrap a tool function with admission control, and coalescing unless coalesce is False.
+
+        Only coalesce tools without side effects: coalesced callers share one
+        result object, which must not be mutated.
+        """
+        async def admitted(args, kwargs):
+            limit = self.limit(name)
+            if limit is None:
+                return await fn(*args, **kwargs)
+            started = time.perf_counter()
+            try:
+                await limit.acquire()
+            except Overloaded:
+                TOOL_REJECTED.inc(name)
+                raise
+            TOOL_QUEUE_SECONDS.observe(name, time.perf_counter() - started)
+            try:
+                return await fn(*args, **kwargs)
+            finally:
+                limit.release()
+
+        @functools.wraps(fn)
+        async def wrapper(*args, **kwargs):
+            key = _call_key(name, args, kwargs) if coalesce else None
+            if key is None:
+                return await admitted(args, kwargs)
+            result, shared = await self._coalescer.run(key, functools.partial(admitted, args, kwargs))
+            if shared:
+                TOOL_COALESCED.inc(name)
+            return result
+        return wrapper
+
+    def stats(self) -> Dict[str, Dict[str, int]]:
+        """Return running and waiting call counts for each limited tool."""
+        return {name: {"running": limit.running, "waiting": limit.waiting}
+                for name, limit in self._limits.items() if limit is not None}
+
+
+def _call_key(name: str, args: tuple, kwargs: dict) -> Optional[str]:
+    # Arguments have already been validated into JSON-like values; anything
+    # else is not coalesced.
+    try:
+        return json.dumps([name, args, kwargs], sort_keys=True)
+    except TypeError:
+        return None
+
+
+tool_admission = ToolAdmission()
+
+
+def configure_tool_admission(concurrency: int = DEFAULT_CONCURRENCY, max_waiting: int = DEFAULT_MAX_WAITING,
+                             limits: Optional[Dict[str, int]] = None):
+    """Set the default per-tool concurrency, the wait queue length and per-tool overrides."""
+    tool_admission.configure(concurrency, max_waiting, limits)
+
+
+def admit_tool(name: str, fn: Callable[..., Awaitable[Any]], coalesce: bool = True):
+    """Wrap a tool function with the shared coalescing and admission control."""
+    return tool_admission.wrap(name, fn, coalesce)
+
+
+def _admission_stat(key: str) -> Callable[[], Dict[str, int]]:
+    return lambda: {name: stats[key] for name, stats in tool_admission.stats().items()}
+
+
+CallbackMetric("insurance_tool_running", "Tool calls currently holding a concurrency slot.", "gauge",
+               _admission_stat("running"), "tool")
+CallbackMetric("insurance_tool_waiting", "Tool calls waiting for a concurrency slot.", "gauge",
+               _admission_stat("waiting"), "tool")
@@ -0,0 +1,49 @@
+from typing import Dict, List, Optional
+from .util import get_database
+from .money import from_cents
+from .metrics import instrument_query
+
+
+def _summary_row(keys: List[str], row) -> Dict:
+    summary = dict(zip(keys, row))
+    summary["total_premium"] = from_cents(summary["total_premium"])
+    return summary
+
+
+@instrument_query
+async def get_premium_summary_by_state() -> List[Dict]:
+    """Return policy count and total premium for each customer state."""
+    async with get_database() as db:
+        cursor = await db.execute("""
+            SELECT state, SUM(policy_count), SUM(premium_cents)
+            FROM premium_summary GROUP BY state ORDER BY state
+        """)
+        rows = await cursor.fetchall()
+        return [_summary_row(["state", "policy_count", "total_premium"], row) for row in rows]
+
+
+@instrument_query
+async def get_premium_summary_by_product() -> List[Dict]:
+    """Return policy count and total premium for each product."""
+    async with get_database() as db:
+        cursor = await db.execute("""
+            SELECT product, SUM(policy_count), SUM(premium_cents)
+            FROM premium_summary GROUP BY product ORDER BY product
+        """)
+        rows = await cursor.fetchall()
+        return [_summary_row(["product", "policy_count", "total_premium"], row) for row in rows]
+
+
+@instrument_query
+async def get_premium_summary_by_state_and_product(state: Optional[str] = None,
+                                                   product: Optional[str] = None) -> List[Dict]:
+    """Return policy count and total premium for each state and product, optionally filtered to one of either."""
+    async with get_database() as db:
+        cursor = await db.execute("""
+            SELECT state, product, policy_count, premium_cents
+            FROM premium_summary
+            WHERE (?1 IS NULL OR state = ?1) AND (?2 IS NULL OR product = ?2)
+            ORDER BY state, product
+        """, (state, product))
+        rows = await cursor.fetchall()
+        return [_summary_row(["state", "product", "policy_count", "total_premium"], row) for row in rows]
@@ -0,0 +1,110 @@
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Hashable, Optional
+from .metrics import CallbackMetric
+
+DEFAULT_CACHE_SIZE = 1024
+DEFAULT_CACHE_TTL = 300.0
+
+
+class EntityCache:
+    """A bounded LRU cache whose entries also expire after a TTL.
+
+    Cached values are shared between callers and must not be mutated.
+    """
+
+    def __init__(self, max_size: int = DEFAULT_CACHE_SIZE, ttl: float = DEFAULT_CACHE_TTL,
+                 clock: Callable[[], float] = time.monotonic):
+        self.max_size = max_size
+        self.ttl = ttl
+        self._clock = clock
+        self._entries: "OrderedDict[Hashable, tuple]" = OrderedDict()
+        # Bumped on every invalidation. A reader that started before a write
+        # passes the version it saw to put(), so it cannot re-insert a value
+        # the write has just made stale.
+        self.version = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key: Hashable) -> Optional[Any]:
+        """Return the cached value for key, or None on a miss."""
+        entry = self._entries.get(key)
+        if entry is not None:
+            value, expires_at = entry
+            if expires_at > self._clock():
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return value
+            del self._entries[key]
+        self.misses += 1
+        return None
+
+    def put(self, key: Hashable, value: Any, version: Optional[int] = None):
+        """Cache value under key unless the cache was invalidated since version."""
+        if self.max_size <= 0 or (version is not None and version != self.version):
+            return
+        self._entries[key] = (value, self._clock() + self.ttl)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+    def invalidate(self, key: Hashable):
+        """Drop key from the cache."""
+        self.version += 1
+        self._entries.pop(key, None)
+
+    def clear(self):
+        """Drop every entry."""
+        self.version += 1
+        self._entries.clear()
+
+    def configure(self, max_size: int, ttl: float):
+        """Change the size bound and TTL, dropping current entries."""
+        self.max_size = max_size
+        self.ttl = ttl
+        self.clear()
+
+    def stats(self) -> Dict[str, int]:
+        """Return hit, miss and eviction counters and the current size."""
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "size": len(self._entries),
+        }
+
+
+customer_cache = EntityCache()
+policy_cache = EntityCache()
+
+
+def configure_entity_caches(max_size: int = DEFAULT_CACHE_SIZE, ttl: float = DEFAULT_CACHE_TTL):
+    """Set the size bound and TTL of the customer and policy caches."""
+    customer_cache.configure(max_size, ttl)
+    policy_cache.configure(max_size, ttl)
+
+
+def clear_entity_caches():
+    """Drop every cached customer and policy."""
+    customer_cache.clear()
+    policy_cache.clear()
+
+
+def entity_cache_stats() -> Dict[str, Dict[str, int]]:
+    """Return counters for each entity cache."""
+    return {
+        "customers": customer_cache.stats(),
+        "policies": policy_cache.stats(),
+    }
+
+
+def _cache_stat(key: str) -> Callable[[], Dict[str, int]]:
+    return lambda: {name: stats[key] for name, stats in entity_cache_stats().items()}
+
+
+CallbackMetric("insurance_cache_hits_total", "Entity cache hits.", "counter", _cache_stat("hits"), "cache")
+CallbackMetric("insurance_cache_misses_total", "Entity cache misses.", "counter", _cache_stat("misses"), "cache")
+CallbackMetric("insurance_cache_evictions_total", "Entity cache LRU evictions.", "counter", _cache_stat("evictions"), "cache")
+CallbackMetric("insurance_cache_entries", "Entries currently in the entity cache.", "gauge", _cache_stat("size"), "cache")
@@ -1,122 +1,277 @@
 import aiosqlite
-from typing import List, Optional
-from model import Customer
-from .util import get_database
+import re
+from typing import AsyncIterator, Dict, Iterable, List, NamedTuple, Optional, Sequence
+from datetime import date
+from decimal import Decimal
+from model import Customer, Policy
+from .util import get_database, write, chunked, placeholders, iter_rows, FETCH_BATCH_SIZE
+from .cache import customer_cache
+from .metrics import instrument_query
+from .money import from_cents
+from .rows import CUSTOMER_ROW, POLICY_ROW, Projection, parse_date
 
 
+@instrument_query
 async def create_customer(customer: Customer) -> int:
     """Create a new customer and return the customer ID."""
-    async with await get_database() as db:
+    async def insert(db: aiosqlite.Connection) -> int:
         cursor = await db.execute("""
             INSERT INTO customers (name, date_of_birth, email, address, state)
             VALUES (?, ?, ?, ?, ?)
         """, (customer.name, customer.date_of_birth.isoformat(), customer.email, customer.address, customer.state))
-        await db.commit()
         return cursor.lastrowid
 
+    customer_id = await write(insert)
+    customer_cache.invalidate(customer_id)
+    return customer_id
 
+
+@instrument_query
 async def get_customer_by_id(customer_id: int) -> Optional[Customer]:
-    """Retrieve a customer by ID."""
-    async with await get_database() as db:
-        cursor = await db.execute("""
-            SELECT id, name, date_of_birth, email, address, state
+    """Retrieve a customer by ID, serving repeat lookups from the entity cache."""
+    customer = customer_cache.get(customer_id)
+    if customer is not None:
+        return customer
+    version = customer_cache.version
+    async with get_database() as db:
+        cursor = await db.execute(f"""
+            SELECT {CUSTOMER_ROW.select}
             FROM customers WHERE id = ?
         """, (customer_id,))
         row = await cursor.fetchone()
         if row:
-            from datetime import date
-            return Customer(
-                id=row[0],
-                name=row[1],
-                date_of_birth=date.fromisoformat(row[2]),
-                email=row[3],
-                address=row[4],
-                state=row[5]
-            )
+            customer = CUSTOMER_ROW.decode(row)
+            customer_cache.put(customer_id, customer, version)
+            return customer
         return None
 
 
+@instrument_query
+async def get_customers_by_ids(customer_ids: Iterable[int]) -> Dict[int, Customer]:
+    """Retrieve customers for a list of IDs, keyed by ID. Unknown IDs are omitted."""
+    customers = {}
+    missing = []
+    for customer_id in dict.fromkeys(customer_ids):
+        customer = customer_cache.get(customer_id)
+        if customer is None:
+            missing.append(customer_id)
+        else:
+            customers[customer_id] = customer
+    if not missing:
+        return customers
+    version = customer_cache.version
+    async with get_database() as db:
+        for chunk in chunked(missing):
+            cursor = await db.execute(f"""
+                SELECT {CUSTOMER_ROW.select}
+                FROM customers WHERE id IN ({placeholders(len(chunk))})
+            """, chunk)
+            rows = await cursor.fetchall()
+            for row in rows:
+                customers[row[0]] = CUSTOMER_ROW.decode(row)
+                customer_cache.put(row[0], customers[row[0]], version)
+        return customers
+
+
+@instrument_query
 async def get_customer_by_email(email: str) -> Optional[Customer]:
     """Retrieve a customer by email."""
-    async with await get_database() as db:
-        cursor = await db.execute("""
-            SELECT id, name, date_of_birth, email, address, state
+    async with get_database() as db:
+        cursor = await db.execute(f"""
+            SELECT {CUSTOMER_ROW.select}
             FROM customers WHERE email = ?
         """, (email,))
         row = await cursor.fetchone()
         if row:
-            from datetime import date
-            return Customer(
-                id=row[0],
-                name=row[1],
-                date_of_birth=date.fromisoformat(row[2]),
-                email=row[3],
-                address=row[4],
-                state=row[5]
-            )
+            return CUSTOMER_ROW.decode(row)
         return None
 
 
+def _match_expression(query: str, prefix: bool) -> str:
+    """Turn free text into an FTS5 query that requires every word, e.g. '"smith"* "oak"*'."""
+    # Quoting each word keeps FTS5 operators and punctuation in the input
+    # from being parsed as query syntax.
+    terms = [f'"{word}"' + ("*" if prefix else "") for word in re.findall(r"\w+", query)]
+    return " ".join(terms)
+
+
+@instrument_query
+async def search_customers(query: str, limit: int = 20, prefix: bool = True) -> List[Customer]:
+    """Find customers whose name, email or address contain every word of query, best match first.
+
+    With prefix, words also match longer words they start with ("smi" finds
+    Smith).
+    """
+    expression = _match_expression(query, prefix)
+    if not expression:
+        return []
+    async with get_database() as db:
+        cursor = await db.execute(f"""
+            WITH hits AS (
+                SELECT rowid, rank FROM customers_fts WHERE customers_fts MATCH ?
+                ORDER BY rank LIMIT ?
+            )
+            SELECT {CUSTOMER_ROW.select}
+            FROM hits JOIN customers ON customers.id = hits.rowid
+            ORDER BY hits.rank
+        """, (expression, limit))
+        rows = await cursor.fetchall()
+        return CUSTOMER_ROW.decode_all(rows)
+
+
+@instrument_query
+async def iter_customers(after_id: int = 0, limit: Optional[int] = None,
+                         batch_size: int = FETCH_BATCH_SIZE) -> AsyncIterator[Customer]:
+    """Stream customers in ID order, starting after after_id."""
+    async for row in iter_rows(f"""
+        SELECT {CUSTOMER_ROW.select}
+        FROM customers WHERE id > ?
+        ORDER BY id LIMIT ?
+    """, (after_id, -1 if limit is None else limit), batch_size):
+        yield CUSTOMER_ROW.decode(row)
+
+
+@instrument_query
+async def get_customers_page(after_id: int = 0, limit: int = 100) -> List[Customer]:
+    """Retrieve up to limit customers with IDs greater than after_id, in ID order."""
+    return [customer async for customer in iter_customers(after_id, limit)]
+
+
+@instrument_query
+async def get_customers_page_projection(after_id: int = 0, limit: int = 100,
+                                        fields: Sequence[str] = CUSTOMER_ROW.fields) -> Projection:
+    """Retrieve only fields of up to limit customers with IDs greater than after_id, in ID order."""
+    decoder = CUSTOMER_ROW.project(fields)
+    async with get_database() as db:
+        cursor = await db.execute(f"""
+            SELECT {decoder.select}
+            FROM customers WHERE id > ?
+            ORDER BY id LIMIT ?
+        """, (after_id, limit))
+        rows = await cursor.fetchall()
+        return decoder.decode_projection(rows)
+
+
+@instrument_query
 async def get_all_customers() -> List[Customer]:
     """Retrieve all customers."""
-    async with await get_database() as db:
-        cursor = await db.execute("""
-            SELECT id, name, date_of_birth, email, address, state
-            FROM customers
-        """)
-        rows = await cursor.fetchall()
-        customers = []
-        for row in rows:
-            from datetime import date
-            customers.append(Customer(
-                id=row[0],
-                name=row[1],
-                date_of_birth=date.fromisoformat(row[2]),
-                email=row[3],
-                address=row[4],
-                state=row[5]
-            ))
-        return customers
+    return [customer async for customer in iter_customers()]
 
 
+@instrument_query
 async def get_customers_by_state(state: str) -> List[Customer]:
     """Retrieve all customers in a specific state."""
-    async with await get_database() as db:
-        cursor = await db.execute("""
-            SELECT id, name, date_of_birth, email, address, state
+    async with get_database() as db:
+        cursor = await db.execute(f"""
+            SELECT {CUSTOMER_ROW.select}
             FROM customers WHERE state = ?
         """, (state,))
         rows = await cursor.fetchall()
-        customers = []
-        for row in rows:
-            from datetime import date
-            customers.append(Customer(
-                id=row[0],
-                name=row[1],
-                date_of_birth=date.fromisoformat(row[2]),
-                email=row[3],
-                address=row[4],
-                state=row[5]
-            ))
-        return customers
+        return CUSTOMER_ROW.decode_all(rows)
+
+
+@instrument_query
+async def get_customers_by_state_projection(state: str, fields: Sequence[str] = CUSTOMER_ROW.fields) -> Projection:
+    """Retrieve only fields of all customers in a specific state."""
+    decoder = CUSTOMER_ROW.project(fields)
+    async with get_database() as db:
+        cursor = await db.execute(f"""
+            SELECT {decoder.select}
+            FROM customers WHERE state = ?
+        """, (state,))
+        rows = await cursor.fetchall()
+        return decoder.decode_projection(rows)
+
+
+class CustomerOverview(NamedTuple):
+    customer: Customer
+    policies: List[Policy]
+    total_premium: Decimal
+    next_expiry: Optional[date]
+    days_to_next_expiry: Optional[int]
+
+    @property
+    def row_count(self) -> int:
+        """Number of policies, as counted by the query metrics."""
+        return len(self.policies)
+
+
+# Overview rows are the customer's columns, the policy's, then two aggregates.
+_CUSTOMER_WIDTH = len(CUSTOMER_ROW.columns)
+
 
+@instrument_query
+async def get_customer_overview(customer_id: int, today: date) -> Optional[CustomerOverview]:
+    """Retrieve a customer with their policies, total premium and next policy end date in one query.
 
+    The next expiry is the earliest end date on or after today. Returns None
+    if the customer does not exist.
+    """
+    async with get_database() as db:
+        # One row per policy (or one with NULL policy columns if there are
+        # none); the window aggregates repeat the totals on every row.
+        cursor = await db.execute(f"""
+            SELECT {CUSTOMER_ROW.select_from("c")}, {POLICY_ROW.select_from("p")},
+                   COALESCE(SUM(p.premium_cents) OVER (), 0),
+                   MIN(CASE WHEN p.end_date >= ?2 THEN p.end_date END) OVER ()
+            FROM customers c LEFT JOIN policies p ON p.customer_id = c.id
+            WHERE c.id = ?1
+            ORDER BY p.id
+        """, (customer_id, today.isoformat()))
+        rows = await cursor.fetchall()
+    if not rows:
+        return None
+    first = rows[0]
+    has_policies = first[_CUSTOMER_WIDTH] is not None
+    policies = [POLICY_ROW.decode(row[_CUSTOMER_WIDTH:-2]) for row in rows] if has_policies else []
+    next_expiry = None if first[-1] is None else parse_date(first[-1])
+    return CustomerOverview(
+        CUSTOMER_ROW.decode(first[:_CUSTOMER_WIDTH]), policies, from_cents(first[-2]),
+        next_expiry, None if next_expiry is None else (next_expiry - today).days)
+
+
+@instrument_query
+async def get_customer_total_premium(customer_id: int) -> Optional[Decimal]:
+    """Sum the premiums of a customer's policies, or return None if the customer does not exist.
+
+    Unlike get_total_premium_by_customer_id() this also checks the customer
+    exists, in the same query.
+    """
+    async with get_database() as db:
+        cursor = await db.execute("""
+            SELECT COALESCE(SUM(p.premium_cents), 0)
+            FROM customers c LEFT JOIN policies p ON p.customer_id = c.id
+            WHERE c.id = ?
+            GROUP BY c.id
+        """, (customer_id,))
+        rows = await cursor.fetchall()
+    return from_cents(rows[0][0]) if rows else None
+
+
+@instrument_query
 async def update_customer(customer_id: int, customer: Customer) -> bool:
     """Update a customer by ID. Returns True if successful, False if customer not found."""
-    async with await get_database() as db:
+    async def update(db: aiosqlite.Connection) -> bool:
         cursor = await db.execute("""
             UPDATE customers 
             SET name = ?, date_of_birth = ?, email = ?, address = ?, state = ?
             WHERE id = ?
         """, (customer.name, customer.date_of_birth.isoformat(), customer.email, 
               customer.address, customer.state, customer_id))
-        await db.commit()
         return cursor.rowcount > 0
 
+    updated = await write(update)
+    customer_cache.invalidate(customer_id)
+    return updated
 
+
+@instrument_query
 async def delete_customer(customer_id: int) -> bool:
     """Delete a customer by ID. Returns True if successful, False if customer not found."""
-    async with await get_database() as db:
+    async def delete(db: aiosqlite.Connection) -> bool:
         cursor = await db.execute("DELETE FROM customers WHERE id = ?", (customer_id,))
-        await db.commit()
-        return cursor.rowcount > 0
\ No newline at end of file
+        return cursor.rowcount > 0
+
+    deleted = await write(delete)
+    customer_cache.invalidate(customer_id)
+    return deleted
\ No newline at end of file
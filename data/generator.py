@@ -0,0 +1,229 @@
+import aiosqlite
+import argparse
+import asyncio
+import random
+import time
+from contextlib import asynccontextmanager
+from datetime import date, timedelta
+from typing import AsyncIterator, Iterable, Iterator, List, NamedTuple, Tuple
+
+# Rows passed to each executemany() call; bounds the memory held by a load.
+INSERT_CHUNK_SIZE = 10000
+
+FIRST_NAMES = [
+    "James", "Mary", "John", "Patricia", "Robert", "Jennifer", "Michael", "Linda", "David", "Elizabeth",
+    "William", "Barbara", "Richard", "Susan", "Joseph", "Jessica", "Thomas", "Sarah", "Christopher", "Karen",
+    "Daniel", "Lisa", "Matthew", "Nancy", "Anthony", "Betty", "Mark", "Sandra", "Steven", "Ashley",
+]
+LAST_NAMES = [
+    "Smith", "Johnson", "Williams", "Brown", "Jones", "Garcia", "Miller", "Davis", "Rodriguez", "Martinez",
+    "Hernandez", "Lopez", "Gonzalez", "Wilson", "Anderson", "Thomas", "Taylor", "Moore", "Jackson", "Martin",
+    "Lee", "Perez", "Thompson", "White", "Harris", "Sanchez", "Clark", "Ramirez", "Lewis", "Robinson",
+]
+STREETS = [
+    "Main St", "Oak Ave", "Pine Rd", "Elm St", "Maple Dr", "Cedar St", "Houston St", "Austin Ave",
+    "Dallas Blvd", "Prairie View Dr", "Oak Hill Rd", "Lakeview Dr", "Park Ave", "Washington St",
+]
+STATES = [
+    "Alabama", "Alaska", "Arizona", "Arkansas", "California", "Colorado", "Connecticut", "Delaware",
+    "Florida", "Georgia", "Hawaii", "Idaho", "Illinois", "Indiana", "Iowa", "Kansas", "Kentucky",
+    "Louisiana", "Maine", "Maryland", "Massachusetts", "Michigan", "Minnesota", "Mississippi",
+    "Missouri", "Montana", "Nebraska", "Nevada", "New Hampshire", "New Jersey", "New Mexico",
+    "New York", "North Carolina", "North Dakota", "Ohio", "Oklahoma", "Oregon", "Pennsylvania",
+    "Rhode Island", "South Carolina", "South Dakota", "Tennessee", "Texas", "Utah", "Vermont",
+    "Virginia", "Washington", "West Virginia", "Wisconsin", "Wyoming",
+]
+# Premium range in whole dollars for each product, matching the fixed sample data.
+PRODUCT_PREMIUMS = {
+    "bicycle": (380, 460),
+    "pet": (275, 380),
+    "boat": (450, 1520),
+    "RV": (1980, 2250),
+    "equine": (780, 950),
+}
+
+# Policies run for 364 days and started between 5 and 360 days ago, like the
+# fixed sample data, so roughly one in twelve ends within the next 30 days.
+POLICY_TERM_DAYS = 364
+START_OFFSET_RANGE = (5, 360)
+
+
+class GeneratorSettings(NamedTuple):
+    customers: int
+    policies_per_customer: int = 2
+    seed: int = 0
+
+
+def generate_customers(count: int, seed: int = 0,
+                       chunk_size: int = INSERT_CHUNK_SIZE) -> Iterator[List[Tuple]]:
+    """Yield chunks of (id, name, date_of_birth, email, address, state) rows for customers 1..count."""
+    rng = random.Random(seed)
+    birthdays = [(date(1950, 1, 1) + timedelta(days=day)).isoformat() for day in range(365 * 55)]
+    house_numbers = [str(number) for number in range(1, 10000)]
+    for start in range(1, count + 1, chunk_size):
+        size = min(chunk_size, count + 1 - start)
+        # Drawing whole columns with choices() is several times faster than
+        # drawing each field of each row separately.
+        firsts = rng.choices(FIRST_NAMES, k=size)
+        lasts = rng.choices(LAST_NAMES, k=size)
+        dobs = rng.choices(birthdays, k=size)
+        numbers = rng.choices(house_numbers, k=size)
+        streets = rng.choices(STREETS, k=size)
+        states = rng.choices(STATES, k=size)
+        yield [
+            # The ID keeps emails unique, as the schema requires.
+            (customer_id, f"{first} {last}", dob, f"{first.lower()}.{last.lower()}.{customer_id}@email.com",
+             f"{number} {street}", state)
+            for customer_id, first, last, dob, number, street, state
+            in zip(range(start, start + size), firsts, lasts, dobs, numbers, streets, states)
+        ]
+
+
+def generate_policies(customer_count: int, policies_per_customer: int, today: date, seed: int = 0,
+                      chunk_size: int = INSERT_CHUNK_SIZE) -> Iterator[List[Tuple]]:
+    """Yield chunks of (customer_id, start_date, end_date, product, premium_cents) rows."""
+    # A separate stream from the customers' so either can change independently.
+    rng = random.Random(seed + 1)
+    # Premiums are whole multiples of $5, stored in cents.
+    offerings = [
+        (product, dollars * 100)
+        for product, (min_premium, max_premium) in PRODUCT_PREMIUMS.items()
+        for dollars in range(min_premium, max_premium + 1, 5)
+    ]
+    products = [
+        [offering for offering in offerings if offering[0] == product]
+        for product in PRODUCT_PREMIUMS
+    ]
+    low, high = START_OFFSET_RANGE
+    terms = [
+        ((today - timedelta(days=offset)).isoformat(),
+         (today - timedelta(days=offset) + timedelta(days=POLICY_TERM_DAYS)).isoformat())
+        for offset in range(low, high + 1)
+    ]
+    total = customer_count * policies_per_customer
+    for start in range(0, total, chunk_size):
+        size = min(chunk_size, total - start)
+        # Pick the product first, then a premium within its range, so each
+        # product is equally likely regardless of how wide its range is.
+        chosen = [rng.choice(options) for options in rng.choices(products, k=size)]
+        chosen_terms = rng.choices(terms, k=size)
+        yield [
+            (index // policies_per_customer + 1, start_date, end_date, product, premium_cents)
+            for index, (product, premium_cents), (start_date, end_date)
+            in zip(range(start, start + size), chosen, chosen_terms)
+        ]
+
+
+async def _pragma(db: aiosqlite.Connection, name: str):
+    cursor = await db.execute(f"PRAGMA {name}")
+    row = await cursor.fetchone()
+    return row[0]
+
+
+@asynccontextmanager
+async def bulk_load(db: aiosqlite.Connection, tables: Iterable[str] = ("customers", "policies")) -> AsyncIterator[aiosqlite.Connection]:
+    """Run the body as one transaction tuned for inserting many rows.
+
+    Durability is relaxed and secondary indexes and triggers on tables are
+    dropped for the duration, then recreated once at the end, which is far
+    cheaper than maintaining indexes row by row. Anything the triggers
+    maintain must be rebuilt by the body. The transaction commits when the
+    body finishes and rolls back (restoring the indexes and triggers) if it
+    raises.
+    """
+    tables = tuple(tables)
+    synchronous = await _pragma(db, "synchronous")
+    cache_size = await _pragma(db, "cache_size")
+    await db.execute("PRAGMA synchronous = OFF")
+    await db.execute("PRAGMA cache_size = -262144")
+    try:
+        await db.execute("BEGIN IMMEDIATE")
+        try:
+            cursor = await db.execute(f"""
+                SELECT type, name, sql FROM sqlite_master
+                WHERE type IN ('index', 'trigger') AND sql IS NOT NULL
+                AND tbl_name IN ({", ".join("?" * len(tables))})
+            """, tables)
+            objects = await cursor.fetchall()
+            for kind, name, _ in objects:
+                await db.execute(f'DROP {kind.upper()} "{name}"')
+            yield db
+            for _, _, sql in objects:
+                await db.execute(sql)
+            await db.commit()
+        except BaseException:
+            await db.rollback()
+            raise
+    finally:
+        await db.execute(f"PRAGMA synchronous = {synchronous}")
+        await db.execute(f"PRAGMA cache_size = {cache_size}")
+
+
+async def load_generated_data(db: aiosqlite.Connection, settings: GeneratorSettings, today: date,
+                              chunk_size: int = INSERT_CHUNK_SIZE) -> Tuple[int, int]:
+    """Insert generated customers and policies and return how many of each.
+
+    The tables are expected to be empty, and the caller owns the transaction
+    (see bulk_load).
+    """
+    customers = generate_customers(settings.customers, settings.seed, chunk_size)
+    customer_count = await _insert_chunks(db, """
+        INSERT INTO customers (id, name, date_of_birth, email, address, state)
+        VALUES (?, ?, ?, ?, ?, ?)
+    """, customers)
+    policies = generate_policies(settings.customers, settings.policies_per_customer, today,
+                                 settings.seed, chunk_size)
+    policy_count = await _insert_chunks(db, """
+        INSERT INTO policies (customer_id, start_date, end_date, product, premium_cents)
+        VALUES (?, ?, ?, ?, ?)
+    """, policies)
+    return customer_count, policy_count
+
+
+async def _insert_chunks(db: aiosqlite.Connection, sql: str, chunks: Iterator[List[Tuple]]) -> int:
+    """executemany() each chunk, generating the next chunk while the last one inserts."""
+    count = 0
+    pending = None
+    for chunk in chunks:
+        if pending is not None:
+            await pending
+        # sqlite3 releases the GIL while stepping statements, so the insert
+        # on the connection's thread overlaps with generating the next chunk.
+        pending = asyncio.ensure_future(db.executemany(sql, chunk))
+        count += len(chunk)
+    if pending is not None:
+        await pending
+    return count
+
+
+async def _generate(database: str, settings: GeneratorSettings):
+    from . import util
+    util.DATABASE_PATH = database
+    await util.open_database(1)
+    try:
+        await util.init_database()
+        util.configure_sample_data(settings)
+        started = time.perf_counter()
+        await util.init_sample_data()
+        elapsed = time.perf_counter() - started
+    finally:
+        await util.close_database()
+    total = settings.customers * (1 + settings.policies_per_customer)
+    print(f"Loaded {settings.customers} customers and {settings.customers * settings.policies_per_customer} "
+          f"policies into {database} in {elapsed:.1f}s ({total / elapsed:,.0f} rows/s)")
+
+
+def main():
+    """Entry point: replace the data in a database with a generated data set."""
+    parser = argparse.ArgumentParser(description="Generate a synthetic customer and policy data set.")
+    parser.add_argument("--customers", type=int, required=True, help="number of customers")
+    parser.add_argument("--policies-per-customer", type=int, default=2, help="policies per customer (default 2)")
+    parser.add_argument("--seed", type=int, default=0, help="random seed (default 0)")
+    parser.add_argument("--database", default="insurance.db", help="SQLite file to load (default insurance.db)")
+    args = parser.parse_args()
+    settings = GeneratorSettings(args.customers, args.policies_per_customer, args.seed)
+    asyncio.run(_generate(args.database, settings))
+
+
+if __name__ == "__main__":
+    main()
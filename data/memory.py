@@ -0,0 +1,122 @@
+import asyncio
+import itertools
+import os
+import sqlite3
+from typing import Optional
+
+# How snapshots reach the disk:
+#   "off"    - never snapshot; the disk file is only read at startup
+#   "normal" - snapshot without fsync; survives a process crash, not power loss
+#   "full"   - fsync the snapshot before it replaces the previous one
+DURABILITY_LEVELS = ("off", "normal", "full")
+DEFAULT_SNAPSHOT_INTERVAL = 300.0
+
+_names = itertools.count()
+
+
+class MemoryDatabase:
+    """A shared in-memory copy of a database file, periodically snapshotted back to it.
+
+    Every connection opened on uri sees the same in-memory database, which
+    lives as long as this object keeps its own connection open. Reads never
+    touch the filesystem. Unlike WAL on disk, a write waits for in-progress
+    reads to finish before it can commit.
+    """
+
+    def __init__(self, path: str, durability: str = "full"):
+        if durability not in DURABILITY_LEVELS:
+            raise ValueError(f"durability must be one of {', '.join(DURABILITY_LEVELS)}")
+        self.path = path
+        self.durability = durability
+        # memdb databases whose name starts with "/" are shared by every
+        # connection in the process that opens the same name.
+        self.uri = f"file:/insurance-{os.getpid()}-{next(_names)}?vfs=memdb"
+        self._keeper: Optional[sqlite3.Connection] = None
+        self._snapshot_version: Optional[int] = None
+        self._lock = asyncio.Lock()
+
+    async def open(self):
+        """Create the in-memory database, loading the file at path if it exists."""
+        await asyncio.to_thread(self._open)
+
+    def _open(self):
+        # Used from worker threads, but only ever by one at a time.
+        self._keeper = sqlite3.connect(self.uri, uri=True, check_same_thread=False)
+        if os.path.exists(self.path) and os.path.getsize(self.path) > 0:
+            source = sqlite3.connect(self.path)
+            try:
+                image = bytearray(source.serialize())
+            finally:
+                source.close()
+            # Bytes 18 and 19 of the header are 2 in a WAL database, which
+            # memdb cannot open; 1 marks a rollback journal database.
+            image[18:20] = b"\x01\x01"
+            staging = sqlite3.connect(":memory:")
+            try:
+                staging.deserialize(bytes(image))
+                staging.backup(self._keeper)
+            finally:
+                staging.close()
+        self._snapshot_version = self._data_version()
+
+    def _data_version(self) -> int:
+        # Changes whenever another connection commits to the database.
+        return self._keeper.execute("PRAGMA data_version").fetchone()[0]
+
+    async def snapshot(self) -> bool:
+        """Write the database to path if it changed since the last snapshot.
+
+        Returns True if a snapshot was written. A write trying to commit waits
+        while the snapshot copies; reads carry on.
+        """
+        if self.durability == "off" or self._keeper is None:
+            return False
+        async with self._lock:
+            return await asyncio.to_thread(self._snapshot)
+
+    def _snapshot(self) -> bool:
+        version = self._data_version()
+        if version == self._snapshot_version:
+            return False
+        # Copy into a temporary file and rename it into place, so the
+        # previous snapshot survives a crash part way through.
+        partial = self.path + ".snapshot"
+        target = sqlite3.connect(partial)
+        try:
+            target.execute(f"PRAGMA synchronous = {'FULL' if self.durability == 'full' else 'OFF'}")
+            self._keeper.backup(target)
+        finally:
+            target.close()
+        if self.durability == "full":
+            with open(partial, "rb") as written:
+                os.fsync(written.fileno())
+        os.replace(partial, self.path)
+        if self.durability == "full" and hasattr(os, "O_DIRECTORY"):
+            # Make the rename itself durable.
+            directory = os.open(os.path.dirname(os.path.abspath(self.path)), os.O_RDONLY | os.O_DIRECTORY)
+            try:
+                os.fsync(directory)
+            finally:
+                os.close(directory)
+        self._snapshot_version = version
+        return True
+
+    async def run_snapshots(self, interval: float):
+        """Snapshot every interval seconds until cancelled."""
+        while True:
+            await asyncio.sleep(interval)
+            # Cancelling the loop must not abandon a copy half way through.
+            await asyncio.shield(self.snapshot())
+
+    async def close(self):
+        """Take a final snapshot and release the in-memory database.
+
+        Close every other connection to uri first.
+        """
+        if self._keeper is None:
+            return
+        try:
+            await self.snapshot()
+        finally:
+            self._keeper.close()
+            self._keeper = None
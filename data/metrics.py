@@ -0,0 +1,237 @@
+import functools
+import inspect
+import logging
+import time
+from bisect import bisect_left
+from datetime import date
+from typing import Callable, Dict, List, Optional, Sequence, Union
+
+# Latency buckets in seconds, from sub-millisecond cache hits up to slow scans.
+DEFAULT_BUCKETS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025,
+                   0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+slow_query_logger = logging.getLogger("insurance_mcp.slow_queries")
+
+# Queries slower than this many seconds are logged; None disables the log.
+_slow_query_threshold: Optional[float] = None
+
+_metrics: List["Metric"] = []
+
+
+def _format_labels(label: Optional[str], value: str, extra: str = "") -> str:
+    parts = []
+    if label is not None:
+        escaped = value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+        parts.append(f'{label}="{escaped}"')
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+
+class Metric:
+    """Base class for metrics rendered in the Prometheus text format."""
+
+    type = "untyped"
+
+    def __init__(self, name: str, help: str, label: Optional[str] = None):
+        self.name = name
+        self.help = help
+        self.label = label
+        _metrics.append(self)
+
+    def samples(self) -> List[str]:
+        raise NotImplementedError
+
+    def render(self) -> List[str]:
+        return [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.type}", *self.samples()]
+
+
+class Counter(Metric):
+    """A monotonically increasing count, optionally split by one label."""
+
+    type = "counter"
+
+    def __init__(self, name: str, help: str, label: Optional[str] = None):
+        super().__init__(name, help, label)
+        self._values: Dict[str, float] = {}
+
+    def inc(self, label_value: str = "", amount: float = 1):
+        self._values[label_value] = self._values.get(label_value, 0) + amount
+
+    def value(self, label_value: str = "") -> float:
+        return self._values.get(label_value, 0)
+
+    def samples(self) -> List[str]:
+        return [f"{self.name}{_format_labels(self.label, key)} {value}" for key, value in self._values.items()]
+
+
+class Histogram(Metric):
+    """Cumulative-bucket latency histogram, optionally split by one label."""
+
+    type = "histogram"
+
+    def __init__(self, name: str, help: str, label: Optional[str] = None,
+                 buckets: Sequence[float] = DEFAULT_BUCKETS):
+        super().__init__(name, help, label)
+        self.buckets = tuple(buckets)
+        # label value -> [per-bucket counts..., +Inf count, sum]
+        self._values: Dict[str, List[float]] = {}
+
+    def observe(self, label_value: str, seconds: float):
+        values = self._values.get(label_value)
+        if values is None:
+            values = self._values[label_value] = [0] * (len(self.buckets) + 1) + [0.0]
+        values[bisect_left(self.buckets, seconds)] += 1
+        values[-1] += seconds
+
+    def count(self, label_value: str = "") -> int:
+        values = self._values.get(label_value)
+        return sum(values[:-1]) if values else 0
+
+    def samples(self) -> List[str]:
+        lines = []
+        for key, values in self._values.items():
+            cumulative = 0
+            for bound, count in zip(self.buckets, values):
+                cumulative += count
+                le = 'le="%s"' % bound
+                lines.append(f"{self.name}_bucket{_format_labels(self.label, key, le)} {cumulative}")
+            cumulative += values[len(self.buckets)]
+            le = 'le="+Inf"'
+            lines.append(f"{self.name}_bucket{_format_labels(self.label, key, le)} {cumulative}")
+            lines.append(f"{self.name}_sum{_format_labels(self.label, key)} {values[-1]}")
+            lines.append(f"{self.name}_count{_format_labels(self.label, key)} {cumulative}")
+        return lines
+
+
+class CallbackMetric(Metric):
+    """A counter or gauge whose values are read from a callback at render time.
+
+    The callback returns a single number, or a dict of label value to number.
+    """
+
+    def __init__(self, name: str, help: str, type: str,
+                 callback: Callable[[], Union[float, Dict[str, float]]], label: Optional[str] = None):
+        super().__init__(name, help, label)
+        self.type = type
+        self.callback = callback
+
+    def samples(self) -> List[str]:
+        values = self.callback()
+        if not isinstance(values, dict):
+            return [f"{self.name} {values}"]
+        return [f"{self.name}{_format_labels(self.label, key)} {value}" for key, value in values.items()]
+
+
+TOOL_CALL_SECONDS = Histogram(
+    "insurance_tool_call_duration_seconds",
+    "Whole MCP tool call, including argument validation and result serialisation.", "tool")
+TOOL_SECONDS = Histogram(
+    "insurance_tool_duration_seconds", "Time spent in the tool function body.", "tool")
+TOOL_ERRORS = Counter("insurance_tool_errors_total", "Tool calls that raised.", "tool")
+QUERY_SECONDS = Histogram(
+    "insurance_query_duration_seconds",
+    "Time spent in data layer calls, including waiting for a pooled connection.", "query")
+QUERY_ROWS = Counter("insurance_query_rows_total", "Rows returned or affected by data layer calls.", "query")
+SLOW_QUERIES = Counter("insurance_slow_queries_total", "Data layer calls slower than the slow-query threshold.", "query")
+POOL_WAIT_SECONDS = Histogram(
+    "insurance_pool_wait_seconds", "Time spent waiting to borrow a pooled connection.")
+POOL_ACQUIRES = Counter("insurance_pool_acquires_total", "Connections borrowed from the pool.")
+
+
+def configure_slow_query_log(threshold_ms: Optional[float]):
+    """Log data layer calls slower than threshold_ms milliseconds; None turns the log off."""
+    global _slow_query_threshold
+    _slow_query_threshold = None if threshold_ms is None else threshold_ms / 1000
+
+
+def _count_rows(result) -> int:
+    if result is None or result is False:
+        return 0
+    if isinstance(result, dict):
+        return sum(len(value) if isinstance(value, list) else 1 for value in result.values())
+    if hasattr(result, "row_count"):
+        return result.row_count
+    if isinstance(result, tuple) and hasattr(result, "_fields"):
+        # A NamedTuple is one record, not a sequence of rows.
+        return 1
+    if isinstance(result, (list, tuple)):
+        return len(result)
+    return 1
+
+
+def _loggable(value) -> str:
+    # Only numbers (IDs, offsets, limits) and dates are logged as is; text and
+    # models may hold customer details, so just their type is shown.
+    if value is None or isinstance(value, (bool, int, float, date)):
+        return repr(value)
+    if isinstance(value, (list, tuple, set, frozenset)):
+        return f"<{type(value).__name__} of {len(value)}>"
+    return f"<{type(value).__name__}>"
+
+
+def record_query(name: str, seconds: float, rows: int, args=(), kwargs=None):
+    """Record the duration and row count of one data layer call."""
+    QUERY_SECONDS.observe(name, seconds)
+    QUERY_ROWS.inc(name, rows)
+    if _slow_query_threshold is not None and seconds >= _slow_query_threshold:
+        SLOW_QUERIES.inc(name)
+        arguments = ", ".join([*map(_loggable, args),
+                               *(f"{key}={_loggable(value)}" for key, value in (kwargs or {}).items())])
+        slow_query_logger.warning("Slow query %s(%s): %.1f ms, %d rows", name, arguments, seconds * 1000, rows)
+
+
+def instrument_query(fn):
+    """Record duration, row count and slow calls for a data layer coroutine or async generator.
+
+    For async generators the duration covers the whole iteration, including
+    time the consumer spends between rows.
+    """
+    name = fn.__name__
+
+    if inspect.isasyncgenfunction(fn):
+        @functools.wraps(fn)
+        async def generator_wrapper(*args, **kwargs):
+            started = time.perf_counter()
+            rows = 0
+            try:
+                async for item in fn(*args, **kwargs):
+                    rows += 1
+                    yield item
+            finally:
+                record_query(name, time.perf_counter() - started, rows, args, kwargs)
+        return generator_wrapper
+
+    @functools.wraps(fn)
+    async def wrapper(*args, **kwargs):
+        started = time.perf_counter()
+        result = None
+        try:
+            result = await fn(*args, **kwargs)
+            return result
+        finally:
+            record_query(name, time.perf_counter() - started, _count_rows(result), args, kwargs)
+    return wrapper
+
+
+def instrument_tool(name: str, fn):
+    """Wrap a tool function so its body's duration and errors are recorded under name."""
+    @functools.wraps(fn)
+    async def wrapper(*args, **kwargs):
+        started = time.perf_counter()
+        try:
+            return await fn(*args, **kwargs)
+        except Exception:
+            TOOL_ERRORS.inc(name)
+            raise
+        finally:
+            TOOL_SECONDS.observe(name, time.perf_counter() - started)
+    return wrapper
+
+
+def render_metrics() -> str:
+    """Render every registered metric in the Prometheus text exposition format."""
+    lines = []
+    for metric in _metrics:
+        lines.extend(metric.render())
+    return "\n".join(lines) + "\n"
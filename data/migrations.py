@@ -0,0 +1,281 @@
+import aiosqlite
+from typing import Iterable, List, NamedTuple
+
+
+class Migration(NamedTuple):
+    version: int
+    description: str
+    statements: List[str]
+
+
+# Append new migrations to the end with the next version number. Never edit a
+# migration that has shipped; databases in the wild record that it has run.
+MIGRATIONS: List[Migration] = [
+    Migration(1, "Create customers, policies and sample_data_log tables", [
+        """
+        CREATE TABLE IF NOT EXISTS customers (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            name TEXT NOT NULL,
+            date_of_birth TEXT NOT NULL,
+            email TEXT UNIQUE NOT NULL,
+            address TEXT NOT NULL,
+            state TEXT NOT NULL,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+        """,
+        """
+        CREATE TABLE IF NOT EXISTS policies (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            customer_id INTEGER NOT NULL,
+            start_date TEXT NOT NULL,
+            end_date TEXT NOT NULL,
+            product TEXT NOT NULL,
+            premium TEXT NOT NULL,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            FOREIGN KEY (customer_id) REFERENCES customers (id)
+        )
+        """,
+        """
+        CREATE TABLE IF NOT EXISTS sample_data_log (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            generation_date TEXT NOT NULL,
+            customer_count INTEGER NOT NULL,
+            policy_count INTEGER NOT NULL,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+        """,
+    ]),
+    Migration(2, "Index customers by state", [
+        "CREATE INDEX IF NOT EXISTS idx_customers_state ON customers (state)",
+    ]),
+    Migration(3, "Index policies by customer", [
+        "CREATE INDEX IF NOT EXISTS idx_policies_customer_id ON policies (customer_id)",
+    ]),
+    Migration(4, "Index policies by end date", [
+        "CREATE INDEX IF NOT EXISTS idx_policies_end_date ON policies (end_date)",
+    ]),
+    Migration(5, "Store policy premiums as integer cents", [
+        # SQLite cannot change a column type in place, so rebuild the table.
+        """
+        CREATE TABLE policies_new (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            customer_id INTEGER NOT NULL,
+            start_date TEXT NOT NULL,
+            end_date TEXT NOT NULL,
+            product TEXT NOT NULL,
+            premium_cents INTEGER NOT NULL,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            FOREIGN KEY (customer_id) REFERENCES customers (id)
+        )
+        """,
+        """
+        INSERT INTO policies_new (id, customer_id, start_date, end_date, product, premium_cents, created_at)
+        SELECT id, customer_id, start_date, end_date, product,
+               CAST(ROUND(CAST(premium AS REAL) * 100) AS INTEGER), created_at
+        FROM policies
+        """,
+        "DROP TABLE policies",
+        "ALTER TABLE policies_new RENAME TO policies",
+        # Covering index: per-customer premium totals never touch the table.
+        "CREATE INDEX idx_policies_customer_id ON policies (customer_id, premium_cents)",
+        "CREATE INDEX idx_policies_end_date ON policies (end_date)",
+    ]),
+    Migration(6, "Maintain premium totals by state and product", [
+        # One row per (customer state, product). Triggers keep it in step with
+        # every write, so the analytics queries read a few hundred rows instead
+        # of aggregating every policy. Policies whose customer does not exist
+        # are not counted.
+        """
+        CREATE TABLE premium_summary (
+            state TEXT NOT NULL,
+            product TEXT NOT NULL,
+            policy_count INTEGER NOT NULL,
+            premium_cents INTEGER NOT NULL,
+            PRIMARY KEY (state, product)
+        ) WITHOUT ROWID
+        """,
+        """
+        INSERT INTO premium_summary (state, product, policy_count, premium_cents)
+        SELECT c.state, p.product, COUNT(*), SUM(p.premium_cents)
+        FROM policies p JOIN customers c ON c.id = p.customer_id
+        GROUP BY c.state, p.product
+        """,
+        """
+        CREATE TRIGGER premium_summary_policy_insert AFTER INSERT ON policies BEGIN
+            INSERT INTO premium_summary (state, product, policy_count, premium_cents)
+            SELECT state, NEW.product, 1, NEW.premium_cents FROM customers WHERE id = NEW.customer_id
+            ON CONFLICT (state, product) DO UPDATE SET
+                policy_count = policy_count + excluded.policy_count,
+                premium_cents = premium_cents + excluded.premium_cents;
+        END
+        """,
+        """
+        CREATE TRIGGER premium_summary_policy_delete AFTER DELETE ON policies BEGIN
+            INSERT INTO premium_summary (state, product, policy_count, premium_cents)
+            SELECT state, OLD.product, -1, -OLD.premium_cents FROM customers WHERE id = OLD.customer_id
+            ON CONFLICT (state, product) DO UPDATE SET
+                policy_count = policy_count + excluded.policy_count,
+                premium_cents = premium_cents + excluded.premium_cents;
+            DELETE FROM premium_summary WHERE product = OLD.product AND policy_count = 0;
+        END
+        """,
+        """
+        CREATE TRIGGER premium_summary_policy_update
+        AFTER UPDATE OF customer_id, product, premium_cents ON policies BEGIN
+            INSERT INTO premium_summary (state, product, policy_count, premium_cents)
+            SELECT state, OLD.product, -1, -OLD.premium_cents FROM customers WHERE id = OLD.customer_id
+            ON CONFLICT (state, product) DO UPDATE SET
+                policy_count = policy_count + excluded.policy_count,
+                premium_cents = premium_cents + excluded.premium_cents;
+            INSERT INTO premium_summary (state, product, policy_count, premium_cents)
+            SELECT state, NEW.product, 1, NEW.premium_cents FROM customers WHERE id = NEW.customer_id
+            ON CONFLICT (state, product) DO UPDATE SET
+                policy_count = policy_count + excluded.policy_count,
+                premium_cents = premium_cents + excluded.premium_cents;
+            DELETE FROM premium_summary WHERE product = OLD.product AND policy_count = 0;
+        END
+        """,
+        """
+        CREATE TRIGGER premium_summary_customer_insert AFTER INSERT ON customers BEGIN
+            INSERT INTO premium_summary (state, product, policy_count, premium_cents)
+            SELECT NEW.state, product, COUNT(*), SUM(premium_cents) FROM policies
+            WHERE customer_id = NEW.id GROUP BY product
+            ON CONFLICT (state, product) DO UPDATE SET
+                policy_count = policy_count + excluded.policy_count,
+                premium_cents = premium_cents + excluded.premium_cents;
+        END
+        """,
+        """
+        CREATE TRIGGER premium_summary_customer_delete AFTER DELETE ON customers BEGIN
+            INSERT INTO premium_summary (state, product, policy_count, premium_cents)
+            SELECT OLD.state, product, -COUNT(*), -SUM(premium_cents) FROM policies
+            WHERE customer_id = OLD.id GROUP BY product
+            ON CONFLICT (state, product) DO UPDATE SET
+                policy_count = policy_count + excluded.policy_count,
+                premium_cents = premium_cents + excluded.premium_cents;
+            DELETE FROM premium_summary WHERE state = OLD.state AND policy_count = 0;
+        END
+        """,
+        """
+        CREATE TRIGGER premium_summary_customer_update
+        AFTER UPDATE OF id, state ON customers WHEN OLD.id IS NOT NEW.id OR OLD.state IS NOT NEW.state BEGIN
+            INSERT INTO premium_summary (state, product, policy_count, premium_cents)
+            SELECT OLD.state, product, -COUNT(*), -SUM(premium_cents) FROM policies
+            WHERE customer_id = OLD.id GROUP BY product
+            ON CONFLICT (state, product) DO UPDATE SET
+                policy_count = policy_count + excluded.policy_count,
+                premium_cents = premium_cents + excluded.premium_cents;
+            INSERT INTO premium_summary (state, product, policy_count, premium_cents)
+            SELECT NEW.state, product, COUNT(*), SUM(premium_cents) FROM policies
+            WHERE customer_id = NEW.id GROUP BY product
+            ON CONFLICT (state, product) DO UPDATE SET
+                policy_count = policy_count + excluded.policy_count,
+                premium_cents = premium_cents + excluded.premium_cents;
+            DELETE FROM premium_summary WHERE state = OLD.state AND policy_count = 0;
+        END
+        """,
+    ]),
+    Migration(7, "Record which data set each sample data generation used", [
+        "ALTER TABLE sample_data_log ADD COLUMN settings TEXT",
+    ]),
+    # An external content table: the text lives only in customers, and the
+    # triggers keep the index in step with it. prefix builds extra index
+    # entries so prefix queries of two or three characters are one lookup.
+    Migration(8, "Add a full-text index over customer names, emails and addresses", [
+        """
+        CREATE VIRTUAL TABLE customers_fts USING fts5(
+            name, email, address,
+            content = 'customers', content_rowid = 'id', prefix = '2 3'
+        )
+        """,
+        """
+        CREATE TRIGGER customers_fts_insert AFTER INSERT ON customers BEGIN
+            INSERT INTO customers_fts (rowid, name, email, address)
+            VALUES (NEW.id, NEW.name, NEW.email, NEW.address);
+        END
+        """,
+        """
+        CREATE TRIGGER customers_fts_delete AFTER DELETE ON customers BEGIN
+            INSERT INTO customers_fts (customers_fts, rowid, name, email, address)
+            VALUES ('delete', OLD.id, OLD.name, OLD.email, OLD.address);
+        END
+        """,
+        """
+        CREATE TRIGGER customers_fts_update AFTER UPDATE OF id, name, email, address ON customers BEGIN
+            INSERT INTO customers_fts (customers_fts, rowid, name, email, address)
+            VALUES ('delete', OLD.id, OLD.name, OLD.email, OLD.address);
+            INSERT INTO customers_fts (rowid, name, email, address)
+            VALUES (NEW.id, NEW.name, NEW.email, NEW.address);
+        END
+        """,
+        "INSERT INTO customers_fts (customers_fts) VALUES ('rebuild')",
+    ]),
+]
+
+SCHEMA_VERSION = MIGRATIONS[-1].version
+
+
+async def get_schema_version(db: aiosqlite.Connection) -> int:
+    """Return the schema version recorded in the database."""
+    cursor = await db.execute("PRAGMA user_version")
+    row = await cursor.fetchone()
+    return row[0]
+
+
+async def migrate(db: aiosqlite.Connection, migrations: Iterable[Migration] = MIGRATIONS) -> int:
+    """Apply every migration newer than the database's version and return the new version."""
+    version = await get_schema_version(db)
+    for migration in migrations:
+        if migration.version <= version:
+            continue
+        # BEGIN IMMEDIATE takes the write lock up front, so two processes
+        # migrating the same file cannot both apply a step.
+        await db.execute("BEGIN IMMEDIATE")
+        try:
+            if await get_schema_version(db) >= migration.version:
+                await db.rollback()
+                continue
+            for statement in migration.statements:
+                await db.execute(statement)
+            await db.execute(f"PRAGMA user_version = {migration.version}")
+            await db.commit()
+        except Exception:
+            await db.rollback()
+            raise
+        version = migration.version
+    return await get_schema_version(db)
+
+
+async def rebuild_premium_summary(db: aiosqlite.Connection):
+    """Recompute premium_summary from scratch, inside the caller's transaction.
+
+    Needed after bulk_load, which suspends the triggers that normally keep it
+    up to date.
+    """
+    await db.execute("DELETE FROM premium_summary")
+    await db.execute("""
+        INSERT INTO premium_summary (state, product, policy_count, premium_cents)
+        SELECT c.state, p.product, COUNT(*), SUM(p.premium_cents)
+        FROM policies p JOIN customers c ON c.id = p.customer_id
+        GROUP BY c.state, p.product
+    """)
+
+
+async def rebuild_customer_search(db: aiosqlite.Connection):
+    """Reindex customers_fts from the customers table, inside the caller's transaction.
+
+    Needed after bulk_load, which suspends the triggers that normally keep it
+    up to date.
+    """
+    await db.execute("INSERT INTO customers_fts (customers_fts) VALUES ('rebuild')")
+
+
+async def explain_query_plan(db: aiosqlite.Connection, sql: str, parameters=()) -> List[str]:
+    """Return the detail lines of EXPLAIN QUERY PLAN for a statement.
+
+    Useful in tests to assert a lookup is served by an index, e.g.
+    ``any("idx_customers_state" in step for step in plan)``.
+    """
+    cursor = await db.execute(f"EXPLAIN QUERY PLAN {sql}", parameters)
+    rows = await cursor.fetchall()
+    return [row[3] for row in rows]
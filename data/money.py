@@ -0,0 +1,14 @@
+from decimal import Decimal, ROUND_HALF_UP
+
+# Premiums are stored as integer cents so sums in SQLite are exact.
+CENTS_PER_UNIT = 100
+
+
+def to_cents(amount: Decimal) -> int:
+    """Convert a currency amount to integer cents, rounding half up."""
+    return int((Decimal(amount) * CENTS_PER_UNIT).to_integral_value(rounding=ROUND_HALF_UP))
+
+
+def from_cents(cents: int) -> Decimal:
+    """Convert integer cents back to a two-decimal-place amount."""
+    return Decimal(cents).scaleb(-2)
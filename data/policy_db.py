@@ -1,102 +1,242 @@
 import aiosqlite
-from typing import List, Optional
+from typing import AsyncIterator, Dict, Iterable, List, Optional, Sequence, Tuple
+from datetime import date, timedelta
 from decimal import Decimal
 from model import Policy
-from .util import get_database
+from .util import get_database, write, chunked, placeholders, iter_rows, FETCH_BATCH_SIZE
+from .money import to_cents, from_cents
+from .cache import policy_cache
+from .metrics import instrument_query
+from .rows import POLICY_ROW, Projection
 
 
+@instrument_query
 async def create_policy(policy: Policy) -> int:
     """Create a new policy and return the policy ID."""
-    async with await get_database() as db:
+    async def insert(db: aiosqlite.Connection) -> int:
         cursor = await db.execute("""
-            INSERT INTO policies (customer_id, start_date, end_date, product, premium)
+            INSERT INTO policies (customer_id, start_date, end_date, product, premium_cents)
             VALUES (?, ?, ?, ?, ?)
-        """, (policy.customer_id, policy.start_date.isoformat(), policy.end_date.isoformat(), policy.product, str(policy.premium)))
-        await db.commit()
+        """, (policy.customer_id, policy.start_date.isoformat(), policy.end_date.isoformat(), policy.product, to_cents(policy.premium)))
         return cursor.lastrowid
 
+    policy_id = await write(insert)
+    policy_cache.invalidate(policy_id)
+    return policy_id
 
+
+@instrument_query
 async def get_policy_by_id(policy_id: int) -> Optional[Policy]:
-    """Retrieve a policy by ID."""
-    async with await get_database() as db:
-        cursor = await db.execute("""
-            SELECT id, customer_id, start_date, end_date, product, premium
+    """Retrieve a policy by ID, serving repeat lookups from the entity cache."""
+    policy = policy_cache.get(policy_id)
+    if policy is not None:
+        return policy
+    version = policy_cache.version
+    async with get_database() as db:
+        cursor = await db.execute(f"""
+            SELECT {POLICY_ROW.select}
             FROM policies WHERE id = ?
         """, (policy_id,))
         row = await cursor.fetchone()
         if row:
-            from datetime import date
-            return Policy(
-                id=row[0],
-                customer_id=row[1],
-                start_date=date.fromisoformat(row[2]),
-                end_date=date.fromisoformat(row[3]),
-                product=row[4],
-                premium=Decimal(row[5])
-            )
+            policy = POLICY_ROW.decode(row)
+            policy_cache.put(policy_id, policy, version)
+            return policy
         return None
 
 
+@instrument_query
+async def get_policies_by_ids(policy_ids: Iterable[int]) -> Dict[int, Policy]:
+    """Retrieve policies for a list of IDs, keyed by ID. Unknown IDs are omitted."""
+    policies = {}
+    missing = []
+    for policy_id in dict.fromkeys(policy_ids):
+        policy = policy_cache.get(policy_id)
+        if policy is None:
+            missing.append(policy_id)
+        else:
+            policies[policy_id] = policy
+    if not missing:
+        return policies
+    version = policy_cache.version
+    async with get_database() as db:
+        for chunk in chunked(missing):
+            cursor = await db.execute(f"""
+                SELECT {POLICY_ROW.select}
+                FROM policies WHERE id IN ({placeholders(len(chunk))})
+            """, chunk)
+            rows = await cursor.fetchall()
+            for row in rows:
+                policies[row[0]] = POLICY_ROW.decode(row)
+                policy_cache.put(row[0], policies[row[0]], version)
+        return policies
+
+
+@instrument_query
+async def iter_policies(after_id: int = 0, limit: Optional[int] = None,
+                        batch_size: int = FETCH_BATCH_SIZE) -> AsyncIterator[Policy]:
+    """Stream policies in ID order, starting after after_id."""
+    async for row in iter_rows(f"""
+        SELECT {POLICY_ROW.select}
+        FROM policies WHERE id > ?
+        ORDER BY id LIMIT ?
+    """, (after_id, -1 if limit is None else limit), batch_size):
+        yield POLICY_ROW.decode(row)
+
+
+@instrument_query
+async def get_policies_page(after_id: int = 0, limit: int = 100) -> List[Policy]:
+    """Retrieve up to limit policies with IDs greater than after_id, in ID order."""
+    return [policy async for policy in iter_policies(after_id, limit)]
+
+
+@instrument_query
+async def get_policies_page_projection(after_id: int = 0, limit: int = 100,
+                                       fields: Sequence[str] = POLICY_ROW.fields) -> Projection:
+    """Retrieve only fields of up to limit policies with IDs greater than after_id, in ID order."""
+    decoder = POLICY_ROW.project(fields)
+    async with get_database() as db:
+        cursor = await db.execute(f"""
+            SELECT {decoder.select}
+            FROM policies WHERE id > ?
+            ORDER BY id LIMIT ?
+        """, (after_id, limit))
+        rows = await cursor.fetchall()
+        return decoder.decode_projection(rows)
+
+
+@instrument_query
 async def get_all_policies() -> List[Policy]:
     """Retrieve all policies."""
-    async with await get_database() as db:
-        cursor = await db.execute("""
-            SELECT id, customer_id, start_date, end_date, product, premium
-            FROM policies
-        """)
-        rows = await cursor.fetchall()
-        policies = []
-        for row in rows:
-            from datetime import date
-            policies.append(Policy(
-                id=row[0],
-                customer_id=row[1],
-                start_date=date.fromisoformat(row[2]),
-                end_date=date.fromisoformat(row[3]),
-                product=row[4],
-                premium=Decimal(row[5])
-            ))
-        return policies
+    return [policy async for policy in iter_policies()]
 
 
+@instrument_query
 async def update_policy(policy_id: int, policy: Policy) -> bool:
     """Update a policy by ID. Returns True if successful, False if policy not found."""
-    async with await get_database() as db:
+    async def update(db: aiosqlite.Connection) -> bool:
         cursor = await db.execute("""
             UPDATE policies 
-            SET customer_id = ?, start_date = ?, end_date = ?, product = ?, premium = ?
+            SET customer_id = ?, start_date = ?, end_date = ?, product = ?, premium_cents = ?
             WHERE id = ?
         """, (policy.customer_id, policy.start_date.isoformat(), policy.end_date.isoformat(), 
-              policy.product, str(policy.premium), policy_id))
-        await db.commit()
+              policy.product, to_cents(policy.premium), policy_id))
         return cursor.rowcount > 0
 
+    updated = await write(update)
+    policy_cache.invalidate(policy_id)
+    return updated
 
+
+@instrument_query
 async def get_policies_by_customer_id(customer_id: int) -> List[Policy]:
     """Retrieve all policies for a specific customer."""
-    async with await get_database() as db:
-        cursor = await db.execute("""
-            SELECT id, customer_id, start_date, end_date, product, premium
+    async with get_database() as db:
+        cursor = await db.execute(f"""
+            SELECT {POLICY_ROW.select}
+            FROM policies WHERE customer_id = ?
+            ORDER BY id
+        """, (customer_id,))
+        rows = await cursor.fetchall()
+        return POLICY_ROW.decode_all(rows)
+
+
+@instrument_query
+async def get_policies_by_customer_id_projection(customer_id: int,
+                                                 fields: Sequence[str] = POLICY_ROW.fields) -> Projection:
+    """Retrieve only fields of all policies for a specific customer."""
+    decoder = POLICY_ROW.project(fields)
+    async with get_database() as db:
+        cursor = await db.execute(f"""
+            SELECT {decoder.select}
             FROM policies WHERE customer_id = ?
+            ORDER BY id
         """, (customer_id,))
         rows = await cursor.fetchall()
-        policies = []
-        for row in rows:
-            from datetime import date
-            policies.append(Policy(
-                id=row[0],
-                customer_id=row[1],
-                start_date=date.fromisoformat(row[2]),
-                end_date=date.fromisoformat(row[3]),
-                product=row[4],
-                premium=Decimal(row[5])
-            ))
+        return decoder.decode_projection(rows)
+
+
+@instrument_query
+async def get_policies_by_customer_ids(customer_ids: Iterable[int]) -> Dict[int, List[Policy]]:
+    """Retrieve policies for a list of customers, keyed by customer ID.
+
+    Every requested customer ID is present in the result, with an empty list
+    if the customer has no policies.
+    """
+    policies = {}
+    async with get_database() as db:
+        for chunk in chunked(customer_ids):
+            for customer_id in chunk:
+                policies[customer_id] = []
+            cursor = await db.execute(f"""
+                SELECT {POLICY_ROW.select}
+                FROM policies WHERE customer_id IN ({placeholders(len(chunk))})
+                ORDER BY customer_id, id
+            """, chunk)
+            rows = await cursor.fetchall()
+            for row in rows:
+                policies[row[1]].append(POLICY_ROW.decode(row))
         return policies
 
 
+@instrument_query
+async def get_policies_expiring_within(days: int, today: date, limit: int = 100) -> List[Tuple[Policy, int]]:
+    """Retrieve up to limit policies ending between today and today + days, soonest first, with their days to end."""
+    # The bounds are computed here rather than with date() in SQL so that the
+    # range on end_date can be answered from idx_policies_end_date.
+    async with get_database() as db:
+        cursor = await db.execute(f"""
+            SELECT {POLICY_ROW.select}, CAST(julianday(end_date) - julianday(?) AS INTEGER)
+            FROM policies WHERE end_date BETWEEN ? AND ?
+            ORDER BY end_date, id LIMIT ?
+        """, (today.isoformat(), today.isoformat(), (today + timedelta(days=days)).isoformat(), limit))
+        rows = await cursor.fetchall()
+        return [(POLICY_ROW.decode(row), row[-1]) for row in rows]
+
+
+@instrument_query
+async def get_days_to_end_by_policy_ids(policy_ids: Iterable[int], today: date) -> Dict[int, int]:
+    """Return the days from today until each policy ends, keyed by policy ID. Unknown IDs are omitted."""
+    days_to_end = {}
+    async with get_database() as db:
+        for chunk in chunked(policy_ids):
+            cursor = await db.execute(f"""
+                SELECT id, CAST(julianday(end_date) - julianday(?) AS INTEGER)
+                FROM policies WHERE id IN ({placeholders(len(chunk))})
+            """, (today.isoformat(), *chunk))
+            rows = await cursor.fetchall()
+            days_to_end.update(rows)
+        return days_to_end
+
+
+@instrument_query
+async def get_total_premium_by_customer_id(customer_id: int) -> Decimal:
+    """Sum the premiums of all policies for a specific customer."""
+    async with get_database() as db:
+        cursor = await db.execute("""
+            SELECT COALESCE(SUM(premium_cents), 0)
+            FROM policies WHERE customer_id = ?
+        """, (customer_id,))
+        row = await cursor.fetchone()
+        return from_cents(row[0])
+
+
+@instrument_query
+async def get_total_premium() -> Decimal:
+    """Sum the premiums of all policies."""
+    async with get_database() as db:
+        cursor = await db.execute("SELECT COALESCE(SUM(premium_cents), 0) FROM policies")
+        row = await cursor.fetchone()
+        return from_cents(row[0])
+
+
+@instrument_query
 async def delete_policy(policy_id: int) -> bool:
     """Delete a policy by ID. Returns True if successful, False if policy not found."""
-    async with await get_database() as db:
+    async def delete(db: aiosqlite.Connection) -> bool:
         cursor = await db.execute("DELETE FROM policies WHERE id = ?", (policy_id,))
-        await db.commit()
-        return cursor.rowcount > 0
\ No newline at end of file
+        return cursor.rowcount > 0
+
+    deleted = await write(delete)
+    policy_cache.invalidate(policy_id)
+    return deleted
\ No newline at end of file
@@ -0,0 +1,107 @@
+import asyncio
+import aiosqlite
+import time
+from contextlib import asynccontextmanager
+from typing import AsyncIterator, List, Optional, Tuple
+from .metrics import POOL_ACQUIRES, POOL_WAIT_SECONDS
+
+DEFAULT_POOL_SIZE = 5
+
+# sqlite3 keeps an LRU of compiled statements per connection. Because pooled
+# connections live for the whole process, every DAO query is prepared once per
+# connection and then reused.
+STATEMENT_CACHE_SIZE = 256
+
+# Applied to every connection when it is opened. In WAL mode readers see the
+# last committed snapshot and never wait for the writer, and synchronous=NORMAL
+# only syncs at checkpoints: a power loss can drop the last few commits but
+# never corrupts the file.
+DEFAULT_PRAGMAS: List[Tuple[str, object]] = [
+    ("journal_mode", "WAL"),
+    ("synchronous", "NORMAL"),
+    ("busy_timeout", 5000),
+    ("cache_size", -16000),      # 16 MiB page cache per connection
+    ("temp_store", "MEMORY"),
+    ("mmap_size", 67108864),     # 64 MiB memory-mapped I/O
+]
+
+
+async def connect(database: str, pragmas: Optional[List[Tuple[str, object]]] = None) -> aiosqlite.Connection:
+    """Open a connection with the statement cache and pragmas applied.
+
+    database is a file name or a file: URI.
+    """
+    db = await aiosqlite.connect(database, cached_statements=STATEMENT_CACHE_SIZE, uri=True)
+    try:
+        for name, value in DEFAULT_PRAGMAS if pragmas is None else pragmas:
+            await db.execute(f"PRAGMA {name} = {value}")
+    except Exception:
+        await db.close()
+        raise
+    return db
+
+
+class ConnectionPool:
+    """A fixed-size pool of long-lived aiosqlite connections."""
+
+    def __init__(self, database: str, size: int = DEFAULT_POOL_SIZE,
+                 pragmas: Optional[List[Tuple[str, object]]] = None):
+        if size < 1:
+            raise ValueError("Pool size must be at least 1")
+        self.database = database
+        self.size = size
+        self.pragmas = DEFAULT_PRAGMAS if pragmas is None else pragmas
+        self._connections: List[aiosqlite.Connection] = []
+        self._idle: asyncio.Queue = asyncio.Queue()
+        self._closed = False
+
+    async def _connect(self) -> aiosqlite.Connection:
+        return await connect(self.database, self.pragmas)
+
+    async def open(self):
+        """Open all connections in the pool."""
+        try:
+            for _ in range(self.size):
+                db = await self._connect()
+                self._connections.append(db)
+                self._idle.put_nowait(db)
+        except Exception:
+            await self.close()
+            raise
+
+    @asynccontextmanager
+    async def acquire(self) -> AsyncIterator[aiosqlite.Connection]:
+        """Borrow a connection, waiting for one to become free if necessary."""
+        if self._closed:
+            raise RuntimeError("Connection pool is closed")
+        started = time.perf_counter()
+        db = await self._idle.get()
+        POOL_WAIT_SECONDS.observe("", time.perf_counter() - started)
+        POOL_ACQUIRES.inc()
+        try:
+            yield db
+        finally:
+            await self._release(db)
+
+    @property
+    def in_use(self) -> int:
+        """Number of connections currently borrowed."""
+        return len(self._connections) - self._idle.qsize()
+
+    async def _release(self, db: aiosqlite.Connection):
+        if self._closed:
+            await db.close()
+            return
+        if db.in_transaction:
+            # The borrower failed before committing; never hand a half-finished
+            # transaction to the next caller.
+            await db.rollback()
+        self._idle.put_nowait(db)
+
+    async def close(self):
+        """Close every idle connection. Borrowed connections close on release."""
+        self._closed = True
+        while not self._idle.empty():
+            db = self._idle.get_nowait()
+            await db.close()
+        self._connections.clear()
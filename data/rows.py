@@ -0,0 +1,129 @@
+from datetime import date
+from functools import lru_cache
+from typing import Any, Callable, Dict, Iterable, List, NamedTuple, Optional, Sequence, Tuple, Type
+from pydantic import BaseModel
+from model import Customer, Policy
+from .money import from_cents
+
+# Dates and premiums repeat heavily across rows (birthdays, policy terms, price
+# points), and both result types are immutable, so parsed values are shared.
+parse_date = lru_cache(maxsize=8192)(date.fromisoformat)
+parse_cents = lru_cache(maxsize=8192)(from_cents)
+
+_new = object.__new__
+_set = object.__setattr__
+
+
+class Projection(NamedTuple):
+    """Selected fields of a list of rows: the field names once, then one value list per row."""
+    columns: List[str]
+    rows: List[list]
+
+    @property
+    def row_count(self) -> int:
+        """Number of rows, as counted by the query metrics."""
+        return len(self.rows)
+
+    def as_dicts(self) -> List[Dict[str, Any]]:
+        """Return one field-name dict per row."""
+        columns = self.columns
+        return [dict(zip(columns, row)) for row in self.rows]
+
+
+class RowDecoder:
+    """Builds models from rows selected with a fixed column list.
+
+    Each entry of columns maps a model field to the SQL expression that
+    selects it and an optional converter for the raw SQLite value.
+    """
+
+    def __init__(self, model: Type[BaseModel], columns: Sequence[Tuple[str, str, Optional[Callable]]]):
+        self.model = model
+        self.columns = list(columns)
+        self.fields = [field for field, _, _ in self.columns]
+        self.select = ", ".join(column for _, column, _ in self.columns)
+        self.complete = set(self.fields) == set(model.model_fields)
+        self._fields_set = set(self.fields)
+        self.decode_dict = self._compile("{}", lambda field, value: f"{field!r}: {value}")
+        self.decode_values = self._compile("[]", lambda field, value: value)
+        self._projections: Dict[Tuple[str, ...], "RowDecoder"] = {}
+
+    def select_from(self, alias: str) -> str:
+        """Return the select list with every column qualified by a table alias, for joins."""
+        return ", ".join(f"{alias}.{column}" for _, column, _ in self.columns)
+
+    def project(self, fields: Iterable[str]) -> "RowDecoder":
+        """Return a decoder that selects only fields, in this decoder's column order."""
+        wanted = set(fields)
+        unknown = wanted.difference(self.fields)
+        if unknown:
+            raise ValueError(f"Unknown fields: {', '.join(sorted(unknown))}")
+        key = tuple(field for field in self.fields if field in wanted)
+        projection = self._projections.get(key)
+        if projection is None:
+            projection = RowDecoder(self.model, [column for column in self.columns if column[0] in wanted])
+            self._projections[key] = projection
+        return projection
+
+    def _compile(self, brackets: str, item: Callable[[str, str], str]) -> Callable[[Sequence[Any]], Any]:
+        """Build a function that converts a row into a dict or list of its converted values.
+
+        The function is generated as a single display, e.g.
+        ``{'id': row[0], 'date_of_birth': convert_2(row[2])}``. This runs about
+        twice as fast as a generic loop over (field, converter) pairs.
+        """
+        namespace: Dict[str, Any] = {}
+        items = []
+        for index, (field, _, convert) in enumerate(self.columns):
+            if convert is None:
+                items.append(item(field, f"row[{index}]"))
+            else:
+                namespace[f"convert_{index}"] = convert
+                items.append(item(field, f"convert_{index}(row[{index}])"))
+        return eval(f"lambda row: {brackets[0]}{', '.join(items)}{brackets[1]}", namespace)
+
+    def decode(self, row: Sequence[Any]) -> BaseModel:
+        """Build a model from a row without running pydantic validation.
+
+        Only use this for rows read from our own schema, whose column types
+        are already guaranteed. This does the same as model_construct() but
+        skips its per-field default handling, which costs more than
+        validating the row.
+        """
+        if not self.complete:
+            raise ValueError("Projected rows cannot be decoded into models; use decode_dict()")
+        instance = _new(self.model)
+        _set(instance, "__dict__", self.decode_dict(row))
+        _set(instance, "__pydantic_fields_set__", self._fields_set)
+        _set(instance, "__pydantic_extra__", None)
+        _set(instance, "__pydantic_private__", None)
+        return instance
+
+    def decode_all(self, rows: Iterable[Sequence[Any]]) -> List[BaseModel]:
+        """Build a model for every row."""
+        decode = self.decode
+        return [decode(row) for row in rows]
+
+    def decode_projection(self, rows: Iterable[Sequence[Any]]) -> Projection:
+        """Convert every row's values without building models."""
+        decode_values = self.decode_values
+        return Projection(self.fields, [decode_values(row) for row in rows])
+
+
+CUSTOMER_ROW = RowDecoder(Customer, [
+    ("id", "id", None),
+    ("name", "name", None),
+    ("date_of_birth", "date_of_birth", parse_date),
+    ("email", "email", None),
+    ("address", "address", None),
+    ("state", "state", None),
+])
+
+POLICY_ROW = RowDecoder(Policy, [
+    ("id", "id", None),
+    ("customer_id", "customer_id", None),
+    ("start_date", "start_date", parse_date),
+    ("end_date", "end_date", parse_date),
+    ("product", "product", None),
+    ("premium", "premium_cents", parse_cents),
+])
@@ -0,0 +1,346 @@
+import aiosqlite
+import argparse
+import asyncio
+import csv
+import json
+import sqlite3
+import sys
+import time
+from typing import Any, Dict, Iterable, Iterator, List, NamedTuple, Optional, TextIO, Tuple
+from pydantic import ValidationError
+from model import Customer, Policy
+from .util import run_exclusive, iter_rows, chunked, placeholders, record_import
+from .money import to_cents, from_cents
+from .cache import clear_entity_caches
+from .rows import CUSTOMER_ROW, POLICY_ROW
+
+# Rows validated and written per transaction. Each chunk is one executemany(),
+# so memory stays bounded however large the input is.
+IMPORT_CHUNK_SIZE = 5000
+
+# Errors kept in an ImportReport; later ones are only counted.
+MAX_REPORTED_ERRORS = 1000
+
+FORMATS = ("csv", "ndjson")
+
+CUSTOMER_COLUMNS = ["id", "name", "date_of_birth", "email", "address", "state"]
+POLICY_COLUMNS = ["id", "customer_id", "start_date", "end_date", "product", "premium"]
+
+Record = Tuple[int, Dict[str, Any]]
+
+# SQLite stores integers as signed 64-bit values.
+SQLITE_MIN_INTEGER = -2 ** 63
+SQLITE_MAX_INTEGER = 2 ** 63 - 1
+
+
+class RowError(NamedTuple):
+    line: int
+    error: str
+
+
+class ImportReport(NamedTuple):
+    inserted: int
+    failed: int
+    errors: List[RowError]
+
+
+def detect_format(path: str) -> str:
+    """Guess csv or ndjson from a file name, defaulting to ndjson."""
+    return "csv" if path.lower().endswith(".csv") else "ndjson"
+
+
+def read_records(source: TextIO, format: str) -> Iterator[Record]:
+    """Yield (line number, field dict) for each record of a CSV or NDJSON stream.
+
+    A line that cannot be parsed is yielded with a None dict so the importer
+    can report it.
+    """
+    if format == "csv":
+        reader = csv.DictReader(source)
+        for row in reader:
+            yield reader.line_num, row
+        return
+    for line_number, line in enumerate(source, 1):
+        if not line.strip():
+            continue
+        try:
+            record = json.loads(line)
+        except ValueError:
+            record = None
+        yield line_number, record if isinstance(record, dict) else None
+
+
+def _chunks(records: Iterable[Record], size: int) -> Iterator[List[Record]]:
+    chunk = []
+    for record in records:
+        chunk.append(record)
+        if len(chunk) >= size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def _validation_message(error: ValidationError) -> str:
+    return "; ".join(f"{'.'.join(map(str, detail['loc']))}: {detail['msg']}" for detail in error.errors())
+
+
+def _check_integers(**values: Optional[int]):
+    """Raise ValueError for a value SQLite cannot store as an integer, so only its row fails."""
+    for name, value in values.items():
+        if value is not None and not SQLITE_MIN_INTEGER <= value <= SQLITE_MAX_INTEGER:
+            raise ValueError(f"{name}: out of range")
+
+
+def _optional_id(record: Dict[str, Any]) -> Optional[int]:
+    # A blank or missing ID lets SQLite assign one.
+    value = record.get("id")
+    return None if value in (None, "") else value
+
+
+async def _insert_rows(db: aiosqlite.Connection, sql: str, rows: List[Tuple[int, tuple]]) -> List[RowError]:
+    """Insert rows with one executemany(), or one by one if a row violates a constraint."""
+    try:
+        await db.executemany(sql, [parameters for _, parameters in rows])
+        return []
+    except sqlite3.IntegrityError:
+        # executemany() stops at the first failing row. Undo the rows before
+        # it and insert one at a time, so only the failing rows are rejected.
+        # A rollback rather than a savepoint: a savepoint spanning thousands
+        # of trigger-firing inserts makes each insert slower than the last.
+        await db.rollback()
+        await db.execute("BEGIN IMMEDIATE")
+    errors = []
+    for line, parameters in rows:
+        try:
+            await db.execute(sql, parameters)
+        except sqlite3.IntegrityError as error:
+            errors.append(RowError(line, str(error)))
+    return errors
+
+
+async def _in_transaction(operation, *args):
+    """Run operation(db, *args) as its own writer transaction and return its result."""
+    async def run(db: aiosqlite.Connection):
+        await db.execute("BEGIN IMMEDIATE")
+        try:
+            result = await operation(db, *args)
+            await db.commit()
+            return result
+        except BaseException:
+            await db.rollback()
+            raise
+    return await run_exclusive(run)
+
+
+class _Importer:
+    """Validates chunks of records and inserts each through the writer."""
+
+    def __init__(self):
+        self.inserted = 0
+        self.failed = 0
+        self.errors: List[RowError] = []
+
+    def error(self, line: int, message: str):
+        self.failed += 1
+        if len(self.errors) < MAX_REPORTED_ERRORS:
+            self.errors.append(RowError(line, message))
+
+    async def run(self, records: Iterable[Record], chunk_size: int, validate, insert, entity: str) -> ImportReport:
+        for chunk in _chunks(records, chunk_size):
+            rows = []
+            for line, record in chunk:
+                if record is None:
+                    self.error(line, "Malformed record")
+                    continue
+                try:
+                    rows.append((line, validate(record)))
+                except ValidationError as error:
+                    self.error(line, _validation_message(error))
+                except ValueError as error:
+                    self.error(line, str(error))
+            if not rows:
+                continue
+            inserted, errors = await _in_transaction(insert, rows)
+            self.inserted += inserted
+            for line, message in errors:
+                self.error(line, message)
+        if self.inserted:
+            # Stops the server replacing the imported rows with sample data.
+            counts = (self.inserted, 0) if entity == "customers" else (0, self.inserted)
+            await _in_transaction(record_import, *counts)
+        clear_entity_caches()
+        return ImportReport(self.inserted, self.failed, sorted(self.errors))
+
+
+def _validate_customer(record: Dict[str, Any]) -> tuple:
+    customer_id = _optional_id(record)
+    customer = Customer.model_validate({**record, "id": 0 if customer_id is None else customer_id})
+    _check_integers(id=customer.id)
+    return (None if customer_id is None else customer.id, customer.name, customer.date_of_birth.isoformat(),
+            customer.email, customer.address, customer.state)
+
+
+async def _insert_customers(db: aiosqlite.Connection, rows: List[Tuple[int, tuple]]) -> Tuple[int, List[RowError]]:
+    errors = await _insert_rows(db, """
+        INSERT INTO customers (id, name, date_of_birth, email, address, state)
+        VALUES (?, ?, ?, ?, ?, ?)
+    """, rows)
+    return len(rows) - len(errors), errors
+
+
+async def import_customers(records: Iterable[Record], chunk_size: int = IMPORT_CHUNK_SIZE) -> ImportReport:
+    """Validate and insert customer records, reporting rows that fail instead of stopping.
+
+    Records need name, date_of_birth, email, address and state; an id is
+    optional. Once anything is imported the database no longer gets sample
+    data.
+    """
+    return await _Importer().run(records, chunk_size, _validate_customer, _insert_customers, "customers")
+
+
+def _validate_policy(record: Dict[str, Any]) -> Tuple[tuple, Optional[str]]:
+    # Policies may reference their customer by customer_id, customer_email or
+    # both; an email is resolved to an ID at insert time.
+    policy_id = _optional_id(record)
+    email = record.get("customer_email") or None
+    by_email_only = email is not None and record.get("customer_id") in (None, "")
+    policy = Policy.model_validate({
+        **record, "id": 0 if policy_id is None else policy_id, **({"customer_id": 0} if by_email_only else {})})
+    _check_integers(id=policy.id, customer_id=policy.customer_id)
+    # Compared as a Decimal: converting a premium like 1e999999 to cents first
+    # would build an enormous int.
+    if not from_cents(SQLITE_MIN_INTEGER) <= policy.premium <= from_cents(SQLITE_MAX_INTEGER):
+        raise ValueError("premium: out of range")
+    return (None if policy_id is None else policy.id, None if by_email_only else policy.customer_id,
+            policy.start_date.isoformat(), policy.end_date.isoformat(), policy.product,
+            to_cents(policy.premium)), email
+
+
+async def _resolve_customers(db: aiosqlite.Connection, column: str, values: List[Any]) -> Dict[Any, int]:
+    """Map each value of column that matches a customer to that customer's ID."""
+    found = {}
+    for chunk in chunked(values):
+        cursor = await db.execute(f"""
+            SELECT {column}, id FROM customers WHERE {column} IN ({placeholders(len(chunk))})
+        """, chunk)
+        found.update(await cursor.fetchall())
+    return found
+
+
+async def _insert_policies(db: aiosqlite.Connection,
+                           rows: List[Tuple[int, Tuple[tuple, Optional[str]]]]) -> Tuple[int, List[RowError]]:
+    known_ids = await _resolve_customers(
+        db, "id", [parameters[1] for _, (parameters, email) in rows if parameters[1] is not None])
+    ids_by_email = await _resolve_customers(db, "email", [email for _, (_, email) in rows if email is not None])
+    errors = []
+    resolved = []
+    for line, (parameters, email) in rows:
+        customer_id = parameters[1]
+        if email is not None:
+            if email not in ids_by_email:
+                errors.append(RowError(line, f"Unknown customer_email {email}"))
+                continue
+            if customer_id is not None and customer_id != ids_by_email[email]:
+                errors.append(RowError(line, f"customer_id {customer_id} does not match customer_email {email}"))
+                continue
+            customer_id = ids_by_email[email]
+        elif customer_id not in known_ids:
+            errors.append(RowError(line, f"Unknown customer_id {customer_id}"))
+            continue
+        resolved.append((line, (parameters[0], customer_id, *parameters[2:])))
+    errors.extend(await _insert_rows(db, """
+        INSERT INTO policies (id, customer_id, start_date, end_date, product, premium_cents)
+        VALUES (?, ?, ?, ?, ?, ?)
+    """, resolved))
+    return len(rows) - len(errors), errors
+
+
+async def import_policies(records: Iterable[Record], chunk_size: int = IMPORT_CHUNK_SIZE) -> ImportReport:
+    """Validate and insert policy records, reporting rows that fail instead of stopping.
+
+    Each record names its customer by customer_id or customer_email; records
+    whose customer does not exist are reported as errors.
+    """
+    return await _Importer().run(records, chunk_size, _validate_policy, _insert_policies, "policies")
+
+
+async def export_customers(output: TextIO, format: str) -> int:
+    """Write every customer to output as CSV or NDJSON, in ID order, from one snapshot, and return the count."""
+    return await _export(output, format, CUSTOMER_COLUMNS,
+                  f"SELECT {CUSTOMER_ROW.select} FROM customers ORDER BY id", lambda row: row)
+
+
+async def export_policies(output: TextIO, format: str) -> int:
+    """Write every policy to output as CSV or NDJSON, in ID order, from one snapshot, and return the count."""
+    return await _export(output, format, POLICY_COLUMNS,
+                  f"SELECT {POLICY_ROW.select} FROM policies ORDER BY id",
+                  lambda row: (*row[:5], str(from_cents(row[5]))))
+
+
+async def _export(output: TextIO, format: str, columns: List[str], sql: str, convert) -> int:
+    # Rows are written straight from SQLite values; dates are already stored
+    # as ISO strings, so no models are built.
+    count = 0
+    if format == "csv":
+        writer = csv.writer(output)
+        writer.writerow(columns)
+        async for row in iter_rows(sql):
+            writer.writerow(convert(row))
+            count += 1
+    else:
+        async for row in iter_rows(sql):
+            output.write(json.dumps(dict(zip(columns, convert(row)))) + "\n")
+            count += 1
+    return count
+
+
+async def _transfer(args) -> int:
+    from . import util
+    util.DATABASE_PATH = args.database
+    await util.open_database(1)
+    try:
+        await util.init_database()
+        format = args.format or detect_format(args.file)
+        started = time.perf_counter()
+        if args.command == "export":
+            export = export_customers if args.entity == "customers" else export_policies
+            if args.file == "-":
+                count = await export(sys.stdout, format)
+            else:
+                with open(args.file, "w", newline="") as output:
+                    count = await export(output, format)
+            print(f"Exported {count} {args.entity} in {time.perf_counter() - started:.1f}s", file=sys.stderr)
+            return 0
+        load = import_customers if args.entity == "customers" else import_policies
+        source = sys.stdin if args.file == "-" else open(args.file, newline="")
+        try:
+            report = await load(read_records(source, format))
+        finally:
+            if source is not sys.stdin:
+                source.close()
+    finally:
+        await util.close_database()
+    for line, message in report.errors:
+        print(f"line {line}: {message}", file=sys.stderr)
+    if report.failed > len(report.errors):
+        print(f"... and {report.failed - len(report.errors)} more errors", file=sys.stderr)
+    print(f"Imported {report.inserted} {args.entity} in {time.perf_counter() - started:.1f}s, "
+          f"{report.failed} rows failed", file=sys.stderr)
+    return 1 if report.failed else 0
+
+
+def main():
+    """Entry point: bulk import or export customers and policies as CSV or NDJSON."""
+    parser = argparse.ArgumentParser(description="Bulk import or export customers and policies.")
+    parser.add_argument("command", choices=["import", "export"])
+    parser.add_argument("entity", choices=["customers", "policies"])
+    parser.add_argument("file", help="CSV or NDJSON file, or - for stdin/stdout")
+    parser.add_argument("--format", choices=FORMATS, help="file format (default from the file extension, else ndjson)")
+    parser.add_argument("--database", default="insurance.db", help="SQLite file (default insurance.db)")
+    args = parser.parse_args()
+    sys.exit(asyncio.run(_transfer(args)))
+
+
+if __name__ == "__main__":
+    main()
@@ -1,59 +1,218 @@
+import asyncio
 import aiosqlite
+import functools
+import logging
 import os
-from typing import Optional
+import sqlite3
+from contextlib import asynccontextmanager
+from typing import AsyncIterator, Iterable, Iterator, List, Optional, Tuple
 from datetime import date, timedelta
+from decimal import Decimal
+from .pool import ConnectionPool, DEFAULT_POOL_SIZE
+from .writer import Writer, WriteOperation
+from .migrations import migrate, rebuild_premium_summary, rebuild_customer_search
+from .money import to_cents
+from .cache import clear_entity_caches
+from .generator import GeneratorSettings, bulk_load, load_generated_data
+from .memory import MemoryDatabase, DEFAULT_SNAPSHOT_INTERVAL, DURABILITY_LEVELS
+from .metrics import CallbackMetric, instrument_query
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+    import msvcrt
 
 DATABASE_PATH = "insurance.db"
 
+logger = logging.getLogger("insurance_mcp")
+
+# "disk" reads and writes DATABASE_PATH directly. "memory" loads it into a
+# shared in-memory database at startup and snapshots it back to the file.
+DATABASE_MODES = ("disk", "memory")
+
+# Recorded as the settings of a sample_data_log row once customers or policies
+# have been imported. The data is then the user's own, and is never replaced
+# by sample data except by an explicit init_sample_data().
+IMPORTED_DATA = "imported"
+
+# Seconds between attempts to take database_lock() while another holder has it.
+LOCK_POLL_INTERVAL = 0.05
+
+# Rows pulled from SQLite per fetchmany() call when streaming a query.
+FETCH_BATCH_SIZE = 500
+
+# Bound parameters per IN (...) query. SQLite builds before 3.32 cap a
+# statement at 999 parameters.
+MAX_IN_PARAMS = 500
+
+# Reads borrow a pooled connection; every write goes through the one writer.
+_pool: Optional[ConnectionPool] = None
+_writer: Optional[Writer] = None
+_pool_lock = asyncio.Lock()
+# Set while the database is held in memory, with the task snapshotting it.
+_memory: Optional[MemoryDatabase] = None
+_snapshot_task: Optional[asyncio.Task] = None
+_database_mode = "disk"
+_snapshot_interval = DEFAULT_SNAPSHOT_INTERVAL
+_snapshot_durability = "full"
+
+# Date the sample data is known to be fresh for. Checked before touching the
+# database so steady-state freshness checks cost no round trip.
+_fresh_for: Optional[date] = None
+# Serialises regeneration so concurrent callers never interleave their deletes
+# and inserts. Always taken before database_lock(): that lock is not
+# reentrant, even within one process, so the opposite order can deadlock.
+_sample_data_lock = asyncio.Lock()
+# When set, sample data is generated at this size instead of the fixed set.
+_generator_settings: Optional[GeneratorSettings] = None
+
+
+CallbackMetric("insurance_pool_connections", "Connections in the pool.", "gauge",
+               lambda: _pool.size if _pool else 0)
+CallbackMetric("insurance_pool_connections_in_use", "Pooled connections currently borrowed.", "gauge",
+               lambda: _pool.in_use if _pool else 0)
+CallbackMetric("insurance_write_queue_depth", "Write operations waiting for the writer.", "gauge",
+               lambda: _writer.pending if _writer else 0)
+
+
+def configure_database(mode: str = "disk", snapshot_interval: float = DEFAULT_SNAPSHOT_INTERVAL,
+                       durability: str = "full"):
+    """Choose whether the next open_database() works on the file or on an in-memory copy of it.
+
+    In memory mode the copy is written back every snapshot_interval seconds
+    (0 for only at shutdown) with the given durability: "full", "normal" or
+    "off".
+    """
+    global _database_mode, _snapshot_interval, _snapshot_durability
+    if mode not in DATABASE_MODES:
+        raise ValueError(f"mode must be one of {', '.join(DATABASE_MODES)}")
+    if snapshot_interval < 0:
+        raise ValueError("snapshot_interval must not be negative")
+    if durability not in DURABILITY_LEVELS:
+        raise ValueError(f"durability must be one of {', '.join(DURABILITY_LEVELS)}")
+    _database_mode, _snapshot_interval, _snapshot_durability = mode, snapshot_interval, durability
+
+
+async def open_database(pool_size: int = DEFAULT_POOL_SIZE) -> ConnectionPool:
+    """Open the shared reader pool and the writer if they are not already open."""
+    global _pool, _writer, _memory, _snapshot_task
+    async with _pool_lock:
+        if _pool is None:
+            memory = None
+            database = DATABASE_PATH
+            if _database_mode == "memory":
+                memory = MemoryDatabase(DATABASE_PATH, _snapshot_durability)
+                await memory.open()
+                database = memory.uri
+            pool = ConnectionPool(database, pool_size)
+            writer = Writer(database)
+            try:
+                await pool.open()
+                await writer.open()
+            except Exception:
+                await writer.close()
+                await pool.close()
+                if memory is not None:
+                    await memory.close()
+                raise
+            _pool, _writer, _memory = pool, writer, memory
+            if memory is not None and _snapshot_interval > 0 and memory.durability != "off":
+                _snapshot_task = asyncio.get_running_loop().create_task(memory.run_snapshots(_snapshot_interval))
+        return _pool
+
+
+def chunked(values: Iterable[int], size: int = MAX_IN_PARAMS) -> Iterator[List[int]]:
+    """Split values into de-duplicated lists of at most size items."""
+    unique = list(dict.fromkeys(values))
+    for start in range(0, len(unique), size):
+        yield unique[start:start + size]
+
+
+def placeholders(count: int) -> str:
+    """Return a comma-separated list of count ? placeholders."""
+    return ", ".join("?" * count)
+
+
+@asynccontextmanager
+async def get_database() -> AsyncIterator[aiosqlite.Connection]:
+    """Borrow a connection from the shared pool, opening it on first use."""
+    pool = _pool or await open_database()
+    async with pool.acquire() as db:
+        yield db
+
+
+async def write(operation: WriteOperation):
+    """Run operation(db) on the writer connection in the next group commit and return its result."""
+    if _writer is None:
+        await open_database()
+    return await _writer.write(operation)
+
+
+async def run_exclusive(operation: WriteOperation):
+    """Run operation(db) on the writer connection on its own; it manages its own transaction."""
+    if _writer is None:
+        await open_database()
+    return await _writer.run_exclusive(operation)
+
 
-async def get_database() -> aiosqlite.Connection:
-    """Get database connection."""
-    return aiosqlite.connect(DATABASE_PATH)
+async def iter_rows(sql: str, parameters=(), batch_size: int = FETCH_BATCH_SIZE) -> AsyncIterator[tuple]:
+    """Yield the rows of a query, fetching batch_size rows at a time.
+
+    The pooled connection is held until the iterator is exhausted or closed.
+    """
+    async with get_database() as db:
+        cursor = await db.execute(sql, parameters)
+        try:
+            while True:
+                rows = await cursor.fetchmany(batch_size)
+                if not rows:
+                    break
+                for row in rows:
+                    yield row
+        finally:
+            await cursor.close()
 
 
 async def init_database():
-    """Initialize the database with required tables."""
-    async with await get_database() as db:
-        await db.execute("""
-            CREATE TABLE IF NOT EXISTS customers (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                name TEXT NOT NULL,
-                date_of_birth TEXT NOT NULL,
-                email TEXT UNIQUE NOT NULL,
-                address TEXT NOT NULL,
-                state TEXT NOT NULL,
-                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-            )
-        """)
-        
-        await db.execute("""
-            CREATE TABLE IF NOT EXISTS policies (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                customer_id INTEGER NOT NULL,
-                start_date TEXT NOT NULL,
-                end_date TEXT NOT NULL,
-                product TEXT NOT NULL,
-                premium TEXT NOT NULL,
-                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                FOREIGN KEY (customer_id) REFERENCES customers (id)
-            )
-        """)
-        
-        await db.execute("""
-            CREATE TABLE IF NOT EXISTS sample_data_log (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                generation_date TEXT NOT NULL,
-                customer_count INTEGER NOT NULL,
-                policy_count INTEGER NOT NULL,
-                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-            )
-        """)
-        await db.commit()
+    """Initialize the database by applying any pending schema migrations."""
+    await run_exclusive(migrate)
+
+
+def configure_sample_data(settings: Optional[GeneratorSettings] = None):
+    """Choose the generated data set size for sample data, or None for the fixed set."""
+    global _generator_settings
+    _generator_settings = settings
 
 
 async def init_sample_data():
     """Always reinitialize the database with fresh sample customer and policy data."""
-    async with await get_database() as db:
+    async with _sample_data_lock:
+        await _generate_sample_data()
+
+
+def _mark_fresh(today: date):
+    """Record that the data is current for today."""
+    global _fresh_for
+    if _fresh_for != today:
+        # The data may have changed since yesterday, possibly in another
+        # process, so nothing cached before today can be trusted.
+        clear_entity_caches()
+    _fresh_for = today
+
+
+async def _generate_sample_data():
+    """Replace all data with the sample set. Callers must hold _sample_data_lock."""
+    global _fresh_for
+    today = date.today()
+    await run_exclusive(functools.partial(_replace_sample_data, today=today))
+    clear_entity_caches()
+    _fresh_for = today
+
+
+async def _replace_sample_data(db: aiosqlite.Connection, today: date):
+    """Replace all data with the sample set in one bulk_load transaction."""
+    async with bulk_load(db):
         # Clear existing data
         await db.execute("DELETE FROM policies")
         await db.execute("DELETE FROM customers")
@@ -61,109 +220,334 @@ async def init_sample_data():
         
         # Reset auto-increment counters
         await db.execute("DELETE FROM sqlite_sequence WHERE name IN ('customers', 'policies', 'sample_data_log')")
-        
-        # Insert sample customers
-        sample_customers = [
-            ("John Smith", "1985-06-15", "john.smith@email.com", "123 Main St", "California"),
-            ("Sarah Johnson", "1990-03-22", "sarah.johnson@email.com", "456 Oak Ave", "Texas"),
-            ("Michael Brown", "1978-11-08", "michael.brown@email.com", "789 Pine Rd", "New York"),
-            ("Emily Davis", "1995-01-30", "emily.davis@email.com", "321 Elm St", "Florida"),
-            ("David Wilson", "1982-09-12", "david.wilson@email.com", "654 Maple Dr", "Illinois"),
-            ("Jessica Martinez", "1987-04-12", "jessica.martinez@email.com", "789 Houston St", "Texas"),
-            ("Robert Garcia", "1992-08-25", "robert.garcia@email.com", "234 Austin Ave", "Texas"),
-            ("Amanda Rodriguez", "1979-12-03", "amanda.rodriguez@email.com", "567 Dallas Blvd", "Texas"),
-            ("Christopher Lee", "1988-01-18", "christopher.lee@email.com", "890 San Antonio Way", "Texas"),
-            ("Michelle Thompson", "1993-07-07", "michelle.thompson@email.com", "345 Fort Worth Dr", "Texas"),
-            ("James Anderson", "1984-11-29", "james.anderson@email.com", "678 Cedar St", "Iowa"),
-            ("Lisa White", "1991-05-14", "lisa.white@email.com", "901 Oak Hill Rd", "Iowa"),
-            ("Daniel Miller", "1986-09-22", "daniel.miller@email.com", "432 Prairie View Dr", "Iowa")
-        ]
-        
-        await db.executemany("""
-            INSERT INTO customers (name, date_of_birth, email, address, state)
-            VALUES (?, ?, ?, ?, ?)
-        """, sample_customers)
-        
-        # Calculate policy dates based on current date
-        today = date.today()
-        
-        # Create sample policies with start dates in the past (within 360 days)
-        policy_offsets = [
-            (1, -30, "bicycle", "450.00"),     # Started 30 days ago
-            (1, -45, "pet", "320.00"),         # Started 45 days ago
-            (2, -60, "boat", "1250.00"),       # Started 60 days ago
-            (2, -90, "RV", "2100.00"),         # Started 90 days ago
-            (3, -120, "equine", "890.00"),     # Started 120 days ago
-            (3, -150, "bicycle", "380.00"),    # Started 150 days ago
-            (4, -15, "pet", "295.00"),         # Started 15 days ago
-            (5, -75, "boat", "1450.00"),       # Started 75 days ago
-            (5, -100, "equine", "950.00"),     # Started 100 days ago
-            (6, -180, "RV", "1980.00"),        # Started 180 days ago
-            (6, -200, "pet", "275.00"),        # Started 200 days ago
-            (7, -5, "bicycle", "425.00"),      # Started 5 days ago
-            (7, -220, "boat", "1320.00"),      # Started 220 days ago
-            (8, -240, "equine", "825.00"),     # Started 240 days ago
-            (9, -25, "pet", "340.00"),         # Started 25 days ago
-            (9, -270, "bicycle", "395.00"),    # Started 270 days ago
-            (10, -50, "boat", "1380.00"),      # Started 50 days ago
-            (11, -300, "RV", "2250.00"),       # Started 300 days ago
-            (11, -320, "equine", "780.00"),    # Started 320 days ago
-            (12, -80, "pet", "310.00"),        # Started 80 days ago
-            (13, -350, "bicycle", "460.00"),   # Started 350 days ago
-            (13, -360, "boat", "1520.00")      # Started 360 days ago
-      ]
-        
-        sample_policies = []
-        for customer_id, start_offset, product, premium in policy_offsets:
-            start_date = today + timedelta(days=start_offset)
-            end_date = start_date + timedelta(days=364)  # 364-day policies
-            sample_policies.append((customer_id, start_date.isoformat(), end_date.isoformat(), product, premium))
-        
-        # Add special policy for customer 2: started 344 days ago, ends 20 days in future
-        special_start = today + timedelta(days=-344)
-        special_end = today + timedelta(days=20)
-        sample_policies.append((2, special_start.isoformat(), special_end.isoformat(), "pet", "380.00"))
-
-        # Add special policy for customer 6: started 344 days ago, ends 20 days in future
-        special_start = today + timedelta(days=-354)
-        special_end = today + timedelta(days=10)
-        sample_policies.append((6, special_start.isoformat(), special_end.isoformat(), "boat", "450.00"))
-        
-        await db.executemany("""
-            INSERT INTO policies (customer_id, start_date, end_date, product, premium)
-            VALUES (?, ?, ?, ?, ?)
-        """, sample_policies)
-        
+
+        if _generator_settings is None:
+            customer_count, policy_count = await _insert_fixed_sample_data(db, today)
+        else:
+            customer_count, policy_count = await load_generated_data(db, _generator_settings, today)
+
+        # bulk_load suspended the triggers that maintain the summary and the
+        # search index.
+        await rebuild_premium_summary(db)
+        await rebuild_customer_search(db)
+
         # Record sample data generation info
         await db.execute("""
-            INSERT INTO sample_data_log (generation_date, customer_count, policy_count)
-            VALUES (?, ?, ?)
-        """, (today.isoformat(), len(sample_customers), len(sample_policies)))
-        
-        await db.commit()
+            INSERT INTO sample_data_log (generation_date, customer_count, policy_count, settings)
+            VALUES (?, ?, ?, ?)
+        """, (today.isoformat(), customer_count, policy_count, _sample_data_settings()))
 
 
-async def ensure_fresh_sample_data():
-    """Check if sample data was generated today, regenerate if not."""
-    today = date.today()
-    async with await get_database() as db:
+async def _insert_fixed_sample_data(db: aiosqlite.Connection, today: date):
+    """Insert the fixed sample customers and policies and return how many of each."""
+    # Insert sample customers
+    sample_customers = [
+        ("John Smith", "1985-06-15", "john.smith@email.com", "123 Main St", "California"),
+        ("Sarah Johnson", "1990-03-22", "sarah.johnson@email.com", "456 Oak Ave", "Texas"),
+        ("Michael Brown", "1978-11-08", "michael.brown@email.com", "789 Pine Rd", "New York"),
+        ("Emily Davis", "1995-01-30", "emily.davis@email.com", "321 Elm St", "Florida"),
+        ("David Wilson", "1982-09-12", "david.wilson@email.com", "654 Maple Dr", "Illinois"),
+        ("Jessica Martinez", "1987-04-12", "jessica.martinez@email.com", "789 Houston St", "Texas"),
+        ("Robert Garcia", "1992-08-25", "robert.garcia@email.com", "234 Austin Ave", "Texas"),
+        ("Amanda Rodriguez", "1979-12-03", "amanda.rodriguez@email.com", "567 Dallas Blvd", "Texas"),
+        ("Christopher Lee", "1988-01-18", "christopher.lee@email.com", "890 San Antonio Way", "Texas"),
+        ("Michelle Thompson", "1993-07-07", "michelle.thompson@email.com", "345 Fort Worth Dr", "Texas"),
+        ("James Anderson", "1984-11-29", "james.anderson@email.com", "678 Cedar St", "Iowa"),
+        ("Lisa White", "1991-05-14", "lisa.white@email.com", "901 Oak Hill Rd", "Iowa"),
+        ("Daniel Miller", "1986-09-22", "daniel.miller@email.com", "432 Prairie View Dr", "Iowa")
+    ]
+    
+    await db.executemany("""
+        INSERT INTO customers (name, date_of_birth, email, address, state)
+        VALUES (?, ?, ?, ?, ?)
+    """, sample_customers)
+    
+    # Create sample policies with start dates in the past (within 360 days)
+    policy_offsets = [
+        (1, -30, "bicycle", "450.00"),     # Started 30 days ago
+        (1, -45, "pet", "320.00"),         # Started 45 days ago
+        (2, -60, "boat", "1250.00"),       # Started 60 days ago
+        (2, -90, "RV", "2100.00"),         # Started 90 days ago
+        (3, -120, "equine", "890.00"),     # Started 120 days ago
+        (3, -150, "bicycle", "380.00"),    # Started 150 days ago
+        (4, -15, "pet", "295.00"),         # Started 15 days ago
+        (5, -75, "boat", "1450.00"),       # Started 75 days ago
+        (5, -100, "equine", "950.00"),     # Started 100 days ago
+        (6, -180, "RV", "1980.00"),        # Started 180 days ago
+        (6, -200, "pet", "275.00"),        # Started 200 days ago
+        (7, -5, "bicycle", "425.00"),      # Started 5 days ago
+        (7, -220, "boat", "1320.00"),      # Started 220 days ago
+        (8, -240, "equine", "825.00"),     # Started 240 days ago
+        (9, -25, "pet", "340.00"),         # Started 25 days ago
+        (9, -270, "bicycle", "395.00"),    # Started 270 days ago
+        (10, -50, "boat", "1380.00"),      # Started 50 days ago
+        (11, -300, "RV", "2250.00"),       # Started 300 days ago
+        (11, -320, "equine", "780.00"),    # Started 320 days ago
+        (12, -80, "pet", "310.00"),        # Started 80 days ago
+        (13, -350, "bicycle", "460.00"),   # Started 350 days ago
+        (13, -360, "boat", "1520.00")      # Started 360 days ago
+    ]
+    
+    sample_policies = []
+    for customer_id, start_offset, product, premium in policy_offsets:
+        start_date = today + timedelta(days=start_offset)
+        end_date = start_date + timedelta(days=364)  # 364-day policies
+        sample_policies.append((customer_id, start_date.isoformat(), end_date.isoformat(), product, to_cents(Decimal(premium))))
+    
+    # Add special policy for customer 2: started 344 days ago, ends 20 days in future
+    special_start = today + timedelta(days=-344)
+    special_end = today + timedelta(days=20)
+    sample_policies.append((2, special_start.isoformat(), special_end.isoformat(), "pet", to_cents(Decimal("380.00"))))
+
+    # Add special policy for customer 6: started 344 days ago, ends 20 days in future
+    special_start = today + timedelta(days=-354)
+    special_end = today + timedelta(days=10)
+    sample_policies.append((6, special_start.isoformat(), special_end.isoformat(), "boat", to_cents(Decimal("450.00"))))
+    
+    await db.executemany("""
+        INSERT INTO policies (customer_id, start_date, end_date, product, premium_cents)
+        VALUES (?, ?, ?, ?, ?)
+    """, sample_policies)
+
+    return len(sample_customers), len(sample_policies)
+
+
+def _sample_data_settings() -> str:
+    """Describe the configured sample data set, as recorded in sample_data_log."""
+    if _generator_settings is None:
+        return "fixed"
+    return ",".join(f"{name}={value}" for name, value in _generator_settings._asdict().items())
+
+
+async def _latest_sample_data() -> Optional[Tuple[date, Optional[str]]]:
+    """Return the date and settings of the last sample data generation, or None if there is none."""
+    async with get_database() as db:
         cursor = await db.execute("""
-            SELECT generation_date FROM sample_data_log 
-            ORDER BY created_at DESC LIMIT 1
+            SELECT generation_date, settings FROM sample_data_log
+            ORDER BY created_at DESC, id DESC LIMIT 1
         """)
         row = await cursor.fetchone()
-        
-        if row is None:
-            # No sample data exists, generate it
-            await init_sample_data()
+        # Close now: an open cursor would keep this connection's read
+        # snapshot, and so the WAL, pinned while the writer regenerates.
+        await cursor.close()
+    return None if row is None else (date.fromisoformat(row[0]), row[1])
+
+
+def _holds_imported_data(latest: Optional[Tuple[date, Optional[str]]]) -> bool:
+    return latest is not None and latest[1] == IMPORTED_DATA
+
+
+async def record_import(db: aiosqlite.Connection, customer_count: int, policy_count: int):
+    """Mark the database as holding imported data, inside the caller's transaction.
+
+    From then on the sample data is no longer regenerated or moved forward.
+    """
+    await db.execute("""
+        INSERT INTO sample_data_log (generation_date, customer_count, policy_count, settings)
+        VALUES (?, ?, ?, ?)
+    """, (date.today().isoformat(), customer_count, policy_count, IMPORTED_DATA))
+
+
+@asynccontextmanager
+async def database_lock() -> AsyncIterator[None]:
+    """Hold an exclusive lock, shared by every process using the database file.
+
+    The lock is a file next to the database, so it works before the database
+    exists and is released by the OS if the process dies.
+    """
+    fd = os.open(DATABASE_PATH + ".lock", os.O_RDWR | os.O_CREAT, 0o644)
+    try:
+        # Polled rather than blocking in a worker thread, which a cancelled
+        # caller could not stop and would leave waiting on a closed fd.
+        while not _try_lock_file(fd):
+            await asyncio.sleep(LOCK_POLL_INTERVAL)
+        yield
+    finally:
+        # Closing the file releases the lock.
+        os.close(fd)
+
+
+def _try_lock_file(fd: int) -> bool:
+    """Take the lock on fd if it is free; return whether it was taken."""
+    try:
+        if fcntl is not None:
+            fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
         else:
-            last_generation_date = date.fromisoformat(row[0])
-            if last_generation_date < today:
-                # Sample data is outdated, regenerate it
-                await init_sample_data()
+            msvcrt.locking(fd, msvcrt.LK_NBLCK, 1)
+    except (BlockingIOError, PermissionError):
+        return False
+    return True
+
+
+@instrument_query
+async def ensure_fresh_sample_data():
+    """Check if sample data is current for today, moving it forward or regenerating it if not."""
+    today = date.today()
+    if _fresh_for == today:
+        return
+
+    async with _sample_data_lock:
+        # Another task may have finished the check or regeneration while we
+        # were waiting for the lock.
+        if _fresh_for == today:
+            return
+        latest = await _latest_sample_data()
+        if latest == (today, _sample_data_settings()) or _holds_imported_data(latest):
+            _mark_fresh(today)
+            return
+        # Another process may be refreshing too; take turns, so the later one
+        # finds the data current instead of replacing it again. Yesterday's
+        # data is moved forward rather than regenerated, so the rollover does
+        # not hold up every tool call while the whole set is rebuilt.
+        async with database_lock():
+            await _refresh_sample_data(today, rebase=True)
+
+
+async def _refresh_sample_data(today: date, rebase: bool = False):
+    """Make the sample data current for today, generating it only if needed.
+
+    With rebase, data generated on an earlier day with the same settings is
+    brought forward by shifting its policy dates, which gives the same rows
+    as regenerating. Callers must hold _sample_data_lock and database_lock().
+    """
+    latest = await _latest_sample_data()
+    if _holds_imported_data(latest):
+        _mark_fresh(today)
+        return
+    if latest is not None and latest[1] == _sample_data_settings():
+        generated_on = latest[0]
+        if generated_on == today:
+            _mark_fresh(today)
+            return
+        if rebase and generated_on < today:
+            await run_exclusive(functools.partial(_rebase_sample_data, days=(today - generated_on).days, today=today))
+            clear_entity_caches()
+            _mark_fresh(today)
+            return
+    await _generate_sample_data()
+
+
+async def _rebase_sample_data(db: aiosqlite.Connection, days: int, today: date):
+    """Shift every policy's dates forward by days in one bulk_load transaction."""
+    # Sample policy terms are all relative to the generation date. Customers'
+    # dates of birth are not, and the premium summary does not depend on dates.
+    async with bulk_load(db, ("policies",)):
+        await db.execute("""
+            UPDATE policies SET start_date = date(start_date, ?1), end_date = date(end_date, ?1)
+        """, (f"+{days} days",))
+        await db.execute("UPDATE sample_data_log SET generation_date = ?", (today.isoformat(),))
+
+
+def _restore_template(template: str, database: str):
+    if not os.path.isfile(template):
+        raise FileNotFoundError(f"Template database not found: {template}")
+    source = sqlite3.connect(template)
+    try:
+        if os.path.exists(database) and os.path.getsize(database) > 0:
+            # Overwrite in place: the backup is one transaction on the
+            # existing database, so it also replaces any WAL contents and
+            # never leaves a half-restored file.
+            target = sqlite3.connect(database)
+            try:
+                source.backup(target)
+            finally:
+                target.close()
+            return
+        # Copy into a temporary file and rename it into place, so a crash part
+        # way through never leaves a half-restored database behind.
+        partial = database + ".restoring"
+        target = sqlite3.connect(partial)
+        try:
+            source.backup(target)
+        finally:
+            target.close()
+    finally:
+        source.close()
+    os.replace(partial, database)
+
+
+def _stored_data_settings(database: str) -> Optional[str]:
+    """Return the settings of the data last loaded into database, or None if it has none."""
+    if not os.path.exists(database) or os.path.getsize(database) == 0:
+        return None
+    db = sqlite3.connect(database)
+    try:
+        row = db.execute("""
+            SELECT settings FROM sample_data_log
+            ORDER BY created_at DESC, id DESC LIMIT 1
+        """).fetchone()
+    except sqlite3.OperationalError:
+        # Not one of our databases, or one from before sample_data_log.
+        return None
+    finally:
+        db.close()
+    return None if row is None else row[0]
+
+
+async def restore_database(template: str) -> bool:
+    """Copy template into place with the SQLite backup API unless the database already holds the data we want.
+
+    The database is kept if its sample data was built with the configured
+    settings, or if it holds imported data. Otherwise, including when the
+    file does not exist yet, it is replaced. Returns True if the database
+    was restored.
+    """
+    settings = await asyncio.to_thread(_stored_data_settings, DATABASE_PATH)
+    if settings in (_sample_data_settings(), IMPORTED_DATA):
+        logger.info("Not restoring %s from template %s: it already holds %s data",
+                    DATABASE_PATH, template, "imported" if settings == IMPORTED_DATA else "current sample")
+        return False
+    await asyncio.to_thread(_restore_template, template, DATABASE_PATH)
+    logger.info("Restored %s from template %s", DATABASE_PATH, template)
+    return True
+
+
+async def prepare_database(pool_size: int = DEFAULT_POOL_SIZE, template: Optional[str] = None):
+    """Open the database and bring its schema and sample data up to date.
+
+    Idempotent and safe to run from several processes at once: they take
+    turns under database_lock(), and later ones find nothing left to do.
+    When template is given, a database that does not exist yet or lacks the
+    configured sample data is restored from it (see restore_database()), and
+    the template's sample data is moved to today rather than regenerated.
+    """
+    async with _sample_data_lock, database_lock():
+        restored = template is not None and await restore_database(template)
+        await open_database(pool_size)
+        await init_database()
+        await _refresh_sample_data(date.today(), rebase=restored)
+
+
+async def snapshot_database() -> bool:
+    """Write the in-memory database back to DATABASE_PATH now, if it changed.
+
+    Returns True if a snapshot was written; always False in disk mode.
+    """
+    return _memory is not None and await _memory.snapshot()
 
 
 async def close_database():
-    """Close database connections (for cleanup)."""
-    # aiosqlite handles connection cleanup automatically
-    pass
\ No newline at end of file
+    """Close the writer, after it finishes queued writes, and the reader pool (for cleanup).
+
+    In memory mode the database is then snapshotted to disk one last time.
+    """
+    global _pool, _writer, _memory, _snapshot_task, _fresh_for
+    _fresh_for = None
+    clear_entity_caches()
+    async with _pool_lock:
+        if _writer is not None:
+            await _writer.close()
+            _writer = None
+        if _pool is not None:
+            await _pool.close()
+            _pool = None
+        if _snapshot_task is not None:
+            _snapshot_task.cancel()
+            try:
+                await _snapshot_task
+            except asyncio.CancelledError:
+                pass
+            _snapshot_task = None
+        if _memory is not None:
+            await _memory.close()
+            _memory = None
\ No newline at end of file
@@ -0,0 +1,171 @@
+import asyncio
+import aiosqlite
+from typing import Any, Awaitable, Callable, List, Optional, Tuple
+from .pool import connect
+from .metrics import Histogram
+
+# Most operations queued while one group commits are written by the next.
+MAX_BATCH_SIZE = 256
+
+WriteOperation = Callable[[aiosqlite.Connection], Awaitable[Any]]
+
+# Queued by close() after the last operation.
+_STOP = object()
+
+WRITE_BATCH_SIZE = Histogram(
+    "insurance_write_batch_size", "Write operations committed together.",
+    buckets=(1, 2, 4, 8, 16, 32, 64, 128, 256))
+
+
+class _Request:
+    __slots__ = ("operation", "exclusive", "future")
+
+    def __init__(self, operation: WriteOperation, exclusive: bool, future: asyncio.Future):
+        self.operation = operation
+        self.exclusive = exclusive
+        self.future = future
+
+
+class Writer:
+    """The only connection that writes, driven by one task fed from a queue.
+
+    Operations submitted while a commit is in progress are run together in
+    the next transaction and committed once, so concurrent writers share a
+    single fsync instead of queueing for the database lock. Each operation
+    runs in its own savepoint: one that raises is rolled back on its own and
+    its caller gets the exception, while the rest of the batch commits.
+    Callers are resumed only after their operation has committed.
+    """
+
+    def __init__(self, database: str, pragmas: Optional[List[Tuple[str, object]]] = None,
+                 max_batch_size: int = MAX_BATCH_SIZE):
+        self.database = database
+        self.pragmas = pragmas
+        self.max_batch_size = max_batch_size
+        self._db: Optional[aiosqlite.Connection] = None
+        self._queue: asyncio.Queue = asyncio.Queue()
+        self._task: Optional[asyncio.Task] = None
+        # An exclusive request or _STOP taken off the queue while a batch was filling.
+        self._held: Optional[_Request] = None
+        self._closed = False
+
+    async def open(self):
+        """Open the writer connection and start the writer task."""
+        self._db = await connect(self.database, self.pragmas)
+        self._task = asyncio.get_running_loop().create_task(self._run())
+
+    @property
+    def pending(self) -> int:
+        """Number of operations waiting to be written."""
+        return self._queue.qsize() + (self._held is not None)
+
+    async def write(self, operation: WriteOperation) -> Any:
+        """Run operation(db) in the next group commit and return its result.
+
+        The operation must not commit, roll back or call write() itself.
+        """
+        return await self._submit(operation, False)
+
+    async def run_exclusive(self, operation: WriteOperation) -> Any:
+        """Run operation(db) on its own, outside any group commit.
+
+        The operation manages its own transaction. Use this for migrations and
+        bulk loads.
+        """
+        return await self._submit(operation, True)
+
+    async def _submit(self, operation: WriteOperation, exclusive: bool) -> Any:
+        if self._closed:
+            raise RuntimeError("Writer is closed")
+        future = asyncio.get_running_loop().create_future()
+        self._queue.put_nowait(_Request(operation, exclusive, future))
+        return await future
+
+    async def _run(self):
+        try:
+            while True:
+                if self._held is not None:
+                    request, self._held = self._held, None
+                else:
+                    request = await self._queue.get()
+                if request is _STOP:
+                    return
+                if request.exclusive:
+                    await self._run_exclusive(request)
+                    continue
+                batch = [request]
+                while len(batch) < self.max_batch_size and not self._queue.empty():
+                    request = self._queue.get_nowait()
+                    if request is _STOP or request.exclusive:
+                        self._held = request
+                        break
+                    batch.append(request)
+                await self._commit_batch(batch)
+        finally:
+            # Never leave a caller waiting on a task that has stopped.
+            self._closed = True
+            while not self._queue.empty():
+                request = self._queue.get_nowait()
+                if request is not _STOP:
+                    _resolve(request.future, error=RuntimeError("Writer is closed"))
+
+    async def _run_exclusive(self, request: _Request):
+        try:
+            result = await request.operation(self._db)
+        except BaseException as error:
+            if self._db.in_transaction:
+                await self._db.rollback()
+            _resolve(request.future, error=error)
+            if not isinstance(error, Exception):
+                raise
+        else:
+            _resolve(request.future, result)
+
+    async def _commit_batch(self, batch: List[_Request]):
+        db = self._db
+        results = []
+        try:
+            await db.execute("BEGIN IMMEDIATE")
+            for request in batch:
+                await db.execute("SAVEPOINT write_operation")
+                try:
+                    result = await request.operation(db)
+                except Exception as error:
+                    await db.execute("ROLLBACK TO write_operation")
+                    results.append((None, error))
+                else:
+                    results.append((result, None))
+                await db.execute("RELEASE write_operation")
+            await db.commit()
+        except BaseException as error:
+            if db.in_transaction:
+                await db.rollback()
+            for request in batch:
+                _resolve(request.future, error=error)
+            if not isinstance(error, Exception):
+                raise
+            return
+        WRITE_BATCH_SIZE.observe("", len(batch))
+        for request, (result, error) in zip(batch, results):
+            _resolve(request.future, result, error)
+
+    async def close(self):
+        """Write everything already queued, then stop the task and close the connection."""
+        if self._closed:
+            return
+        self._closed = True
+        if self._task is not None:
+            self._queue.put_nowait(_STOP)
+            await self._task
+        if self._db is not None:
+            await self._db.close()
+
+
+def _resolve(future: asyncio.Future, result: Any = None, error: Optional[BaseException] = None):
+    # The caller may have been cancelled while its operation was in flight.
+    if future.done():
+        return
+    if error is not None:
+        future.set_exception(error)
+    else:
+        future.set_result(result)
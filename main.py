@@ -1,26 +1,190 @@
 from mcp.server.fastmcp import FastMCP
-from fastmcp.exceptions import ToolError
-from typing import List
+from mcp.server.fastmcp.exceptions import ToolError
+from typing import List, Literal, Optional
 from datetime import date
 from model import Customer, Policy
-from data import get_all_customers, get_customer_by_id, get_customers_by_state, get_all_policies, get_policy_by_id, get_policies_by_customer_id, init_database, init_sample_data, ensure_fresh_sample_data
+from data import get_customers_page, get_customers_page_projection, get_customer_by_id, get_customers_by_ids, get_customers_by_state, get_customers_by_state_projection, search_customers, get_customer_overview, get_customer_total_premium, get_policies_page, get_policies_page_projection, get_policy_by_id, get_policies_by_ids, get_policies_by_customer_id, get_policies_by_customer_id_projection, get_policies_by_customer_ids, get_policies_expiring_within, get_days_to_end_by_policy_ids, get_premium_summary_by_state, get_premium_summary_by_product, get_premium_summary_by_state_and_product, prepare_database, configure_database, configure_sample_data, GeneratorSettings, ensure_fresh_sample_data, close_database, configure_entity_caches, configure_slow_query_log, configure_tool_admission, admit_tool, instrument_tool, render_metrics, TOOL_CALL_SECONDS, CUSTOMER_ROW, POLICY_ROW, RowDecoder, Projection
+from starlette.requests import Request
+from starlette.responses import PlainTextResponse
+import base64
+import pydantic_core
+import json
 import os
+import time
 from dotenv import load_dotenv
 
 load_dotenv()
 
 
 PORT = os.environ.get("PORT", 8000)
+# "memory" serves the database from a shared in-memory copy of insurance.db,
+# snapshotted back to the file every SNAPSHOT_INTERVAL seconds (0 for only at
+# shutdown). SNAPSHOT_DURABILITY is full (fsync), normal or off (never write).
+DATABASE_MODE = os.environ.get("DATABASE_MODE", "disk")
+SNAPSHOT_INTERVAL = float(os.environ.get("SNAPSHOT_INTERVAL", 300))
+SNAPSHOT_DURABILITY = os.environ.get("SNAPSHOT_DURABILITY", "full")
+DB_POOL_SIZE = int(os.environ.get("DB_POOL_SIZE", 5))
+ENTITY_CACHE_SIZE = int(os.environ.get("ENTITY_CACHE_SIZE", 1024))
+ENTITY_CACHE_TTL = float(os.environ.get("ENTITY_CACHE_TTL", 300))
+# Set SAMPLE_CUSTOMERS to load a generated data set of that size instead of the
+# fixed sample data.
+SAMPLE_CUSTOMERS = os.environ.get("SAMPLE_CUSTOMERS")
+SAMPLE_POLICIES_PER_CUSTOMER = int(os.environ.get("SAMPLE_POLICIES_PER_CUSTOMER", 2))
+SAMPLE_SEED = int(os.environ.get("SAMPLE_SEED", 0))
+# Prebuilt database (e.g. from insurance-mcp-generate) copied into place on
+# first start instead of generating the sample data.
+TEMPLATE_DATABASE = os.environ.get("TEMPLATE_DATABASE")
+# Data layer calls slower than this many milliseconds are logged; unset disables the log.
+SLOW_QUERY_MS = os.environ.get("SLOW_QUERY_MS")
+
+# Concurrent calls per tool, and calls that may queue behind them before
+# further calls are rejected (0 for no limit). The listing tools read up to
+# MAX_PAGE_SIZE rows a call, so a burst of them is held to half the pool and
+# leaves connections free for lookups.
+TOOL_CONCURRENCY = int(os.environ.get("TOOL_CONCURRENCY", 32))
+TOOL_QUEUE_SIZE = int(os.environ.get("TOOL_QUEUE_SIZE", 64))
+LISTING_TOOL_CONCURRENCY = int(os.environ.get("LISTING_TOOL_CONCURRENCY", max(1, DB_POOL_SIZE // 2)))
+LISTING_TOOLS = ("Get_all_customers", "Get_all_policies", "Get_customer_in_state", "Get_policies_expiring_within")
+
+DEFAULT_PAGE_SIZE = 100
+MAX_PAGE_SIZE = 500
+DEFAULT_SEARCH_LIMIT = 20
+
+# "objects" returns one JSON object per row; "columns" returns the field names
+# once and then one array of values per row.
+ListFormat = Literal["objects", "columns"]
+
+FIELDS_DESCRIPTION = (" Pass fields to return only those fields (id is always included), and format=columns"
+                      " to get {columns, rows} with the field names once and one array of values per row.")
+
+
+class InstrumentedFastMCP(FastMCP):
+    """FastMCP server that records latency and error metrics for every tool.
+
+    Every tool is read-only, so identical concurrent calls share one result,
+    and each tool is held to its concurrency limit.
+    """
+
+    def add_tool(self, fn, name=None, *args, **kwargs):
+        name = name or fn.__name__
+        super().add_tool(admit_tool(name, instrument_tool(name, fn)), name, *args, **kwargs)
+
+    async def call_tool(self, name, arguments):
+        started = time.perf_counter()
+        try:
+            return await super().call_tool(name, arguments)
+        finally:
+            # Only label registered tools, so unknown names cannot grow the metric.
+            if self._tool_manager.get_tool(name) is not None:
+                TOOL_CALL_SECONDS.observe(name, time.perf_counter() - started)
 
 
 # Create an MCP server
-mcp = FastMCP(host="0.0.0.0", port=PORT)
+mcp = InstrumentedFastMCP(host="0.0.0.0", port=PORT)
+
+
+@mcp.custom_route("/metrics", methods=["GET"])
+async def metrics_endpoint(request: Request):
+    return PlainTextResponse(render_metrics(), media_type="text/plain; version=0.0.4")
+
+@mcp.resource("metrics://prometheus", name="metrics", mime_type="text/plain",
+              description="Tool, query, pool and cache metrics in the Prometheus text format.")
+def metrics_resource() -> str:
+    return render_metrics()
+
+
+def _encode_cursor(listing: str, last_id: int) -> str:
+    """Build an opaque continuation token for the page after last_id."""
+    payload = json.dumps({"listing": listing, "after": last_id})
+    return base64.urlsafe_b64encode(payload.encode()).decode()
+
+
+def _decode_cursor(listing: str, cursor: Optional[str]) -> int:
+    """Return the ID a continuation token resumes after, or 0 for the first page."""
+    if not cursor:
+        return 0
+    try:
+        payload = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+        if payload["listing"] != listing:
+            raise ValueError(listing)
+        return int(payload["after"])
+    except (ValueError, KeyError, TypeError):
+        raise ToolError("Invalid cursor")
+
+
+def _check_page_size(page_size: int, argument: str = "page_size"):
+    if not 1 <= page_size <= MAX_PAGE_SIZE:
+        raise ToolError(f"{argument} must be between 1 and {MAX_PAGE_SIZE}")
+
+
+def _selected_fields(fields: Optional[List[str]], decoder: RowDecoder) -> List[str]:
+    """Return the fields to select: all of them when fields is None, else fields plus id."""
+    if fields is None:
+        return decoder.fields
+    unknown = set(fields).difference(decoder.fields)
+    if unknown:
+        raise ToolError(f"Unknown fields: {', '.join(sorted(unknown))}. Choose from {', '.join(decoder.fields)}")
+    return ["id", *fields]
+
+
+def _compact(result) -> str:
+    # FastMCP indents the JSON of anything but a string, which would undo most
+    # of the saving of the columnar format.
+    return pydantic_core.to_json(result).decode()
+
+
+def _list_result(projection: Projection, format: ListFormat):
+    return _compact(projection._asdict()) if format == "columns" else projection.as_dicts()
+
+
+def _projected_page(listing: str, projection: Projection, page_size: int, format: ListFormat):
+    """Split a page fetched with one extra row into the result and the next cursor."""
+    next_cursor = None
+    if len(projection.rows) > page_size:
+        projection = projection._replace(rows=projection.rows[:page_size])
+        # id is always the first column of a projection.
+        next_cursor = _encode_cursor(listing, projection.rows[-1][0])
+    if format == "columns":
+        return _compact({listing: projection._asdict(), "next_cursor": next_cursor})
+    return {listing: projection.as_dicts(), "next_cursor": next_cursor}
+
 
 @mcp.tool(name="Get_all_customers",
-          description="Retrieves all customers.")
-async def get_customers():
+          description="Retrieves all customers one page at a time. Pass next_cursor from the response to get the next page; it is null on the last page." + FIELDS_DESCRIPTION)
+async def get_customers(page_size: int = DEFAULT_PAGE_SIZE, cursor: Optional[str] = None,
+                        fields: Optional[List[str]] = None, format: ListFormat = "objects"):
     await ensure_fresh_sample_data()
-    return await get_all_customers()
+    _check_page_size(page_size)
+    after_id = _decode_cursor("customers", cursor)
+    # Fetch one extra row to learn whether another page follows.
+    if fields is not None or format == "columns":
+        projection = await get_customers_page_projection(
+            after_id, page_size + 1, _selected_fields(fields, CUSTOMER_ROW))
+        return _projected_page("customers", projection, page_size, format)
+    customers = await get_customers_page(after_id, page_size + 1)
+    next_cursor = None
+    if len(customers) > page_size:
+        customers = customers[:page_size]
+        next_cursor = _encode_cursor("customers", customers[-1].id)
+    return {"customers": customers, "next_cursor": next_cursor}
+
+@mcp.tool(name="Get_all_policies",
+          description="Retrieves all policies one page at a time. Pass next_cursor from the response to get the next page; it is null on the last page." + FIELDS_DESCRIPTION)
+async def get_policies(page_size: int = DEFAULT_PAGE_SIZE, cursor: Optional[str] = None,
+                       fields: Optional[List[str]] = None, format: ListFormat = "objects"):
+    await ensure_fresh_sample_data()
+    _check_page_size(page_size)
+    after_id = _decode_cursor("policies", cursor)
+    if fields is not None or format == "columns":
+        projection = await get_policies_page_projection(
+            after_id, page_size + 1, _selected_fields(fields, POLICY_ROW))
+        return _projected_page("policies", projection, page_size, format)
+    policies = await get_policies_page(after_id, page_size + 1)
+    next_cursor = None
+    if len(policies) > page_size:
+        policies = policies[:page_size]
+        next_cursor = _encode_cursor("policies", policies[-1].id)
+    return {"policies": policies, "next_cursor": next_cursor}
 
 @mcp.tool(name="Get_customer_by_ID",
           description="Retrieves a customer using the customer ID.")
@@ -28,35 +192,79 @@ async def get_customer(customer_id: int):
     await ensure_fresh_sample_data()
     customer = await get_customer_by_id(customer_id)
     if customer is None:
-        raise ToolError(status_code=404, detail="Customer not found")
+        raise ToolError("Customer not found")
     return customer
 
+@mcp.tool(name="Get_customers_by_IDs",
+          description="Retrieves several customers at once using a list of customer IDs.")
+async def get_customers_batch(customer_ids: List[int]):
+    await ensure_fresh_sample_data()
+    customers = await get_customers_by_ids(customer_ids)
+    return {
+        "customers": customers,
+        "not_found": [customer_id for customer_id in dict.fromkeys(customer_ids) if customer_id not in customers]
+    }
+
 @mcp.tool(name="Get_customer_policies",
-          description="Retrieves a customers policies using the customer ID.")
-async def get_customer_policies(customer_id: int):
+          description="Retrieves a customers policies using the customer ID." + FIELDS_DESCRIPTION)
+async def get_customer_policies(customer_id: int, fields: Optional[List[str]] = None, format: ListFormat = "objects"):
     await ensure_fresh_sample_data()
+    if fields is not None or format == "columns":
+        projection = await get_policies_by_customer_id_projection(customer_id, _selected_fields(fields, POLICY_ROW))
+        return _list_result(projection, format)
     policies = await get_policies_by_customer_id(customer_id)
     return policies
 
+@mcp.tool(name="Get_policies_for_customers",
+          description="Retrieves the policies of several customers at once using a list of customer IDs.")
+async def get_customers_policies_batch(customer_ids: List[int]):
+    await ensure_fresh_sample_data()
+    return await get_policies_by_customer_ids(customer_ids)
+
+@mcp.tool(name="Get_policies_by_IDs",
+          description="Retrieves several policies at once using a list of policy IDs.")
+async def get_policies_batch(policy_ids: List[int]):
+    await ensure_fresh_sample_data()
+    policies = await get_policies_by_ids(policy_ids)
+    return {
+        "policies": policies,
+        "not_found": [policy_id for policy_id in dict.fromkeys(policy_ids) if policy_id not in policies]
+    }
+
 @mcp.tool(name="Get_customer_in_state",
-          description="Retrieves customers in a specific state.")
-async def get_customers_in_state(state: str):
+          description="Retrieves customers in a specific state." + FIELDS_DESCRIPTION)
+async def get_customers_in_state(state: str, fields: Optional[List[str]] = None, format: ListFormat = "objects"):
     await ensure_fresh_sample_data()
+    if fields is not None or format == "columns":
+        projection = await get_customers_by_state_projection(state, _selected_fields(fields, CUSTOMER_ROW))
+        return _list_result(projection, format)
     customers = await get_customers_by_state(state)
     return customers
 
+@mcp.tool(name="Search_customers",
+          description="Finds customers whose name, email or address contain every word of the query, best match first. Words match as prefixes (\"smi oak\" finds Smith on Oak Ave) unless prefix is false.")
+async def find_customers(query: str, limit: int = DEFAULT_SEARCH_LIMIT, prefix: bool = True):
+    await ensure_fresh_sample_data()
+    _check_page_size(limit, "limit")
+    return await search_customers(query, limit, prefix)
+
+@mcp.tool(name="Get_customer_overview",
+          description="Retrieves a customer together with their policies, the total of their premiums and the next date one of their policies ends, with the days until then.")
+async def get_customer_summary(customer_id: int):
+    await ensure_fresh_sample_data()
+    overview = await get_customer_overview(customer_id, date.today())
+    if overview is None:
+        raise ToolError("Customer not found")
+    return overview._asdict()
+
 @mcp.tool(name="Calculate_total_customer_premium",
           description="Sums all the policy premiums of a customer.")
-async def get_customer_total_premium(customer_id: int):
+async def get_customer_premium(customer_id: int):
     await ensure_fresh_sample_data()
-    
-    customer = await get_customer_by_id(customer_id)
-    if customer is None:
-        raise ToolError(status_code=404, detail="Customer not found")
-    
-    policies = await get_policies_by_customer_id(customer_id)
-    total_premium = sum(policy.premium for policy in policies)
-    
+    # One query both checks the customer exists and sums the premiums.
+    total_premium = await get_customer_total_premium(customer_id)
+    if total_premium is None:
+        raise ToolError("Customer not found")
     return {"customer_id": customer_id, "total_premium": total_premium}
 
 @mcp.tool(name="Calculate_days_until_policy_end",
@@ -66,7 +274,7 @@ async def get_policy_days_to_end(policy_id: int):
 
     policy = await get_policy_by_id(policy_id)
     if policy is None:
-        raise ToolError(status_code=404, detail="Policy not found")
+        raise ToolError("Policy not found")
 
     today = date.today()
     days_to_end = (policy.end_date - today).days
@@ -76,14 +284,73 @@ async def get_policy_days_to_end(policy_id: int):
         "days_to_end": days_to_end
     }
 
+@mcp.tool(name="Calculate_days_until_policies_end",
+          description="Calculate the number of days until each of several policies ends, using a list of policy IDs.")
+async def get_policies_days_to_end(policy_ids: List[int]):
+    await ensure_fresh_sample_data()
+    days_to_end = await get_days_to_end_by_policy_ids(policy_ids, date.today())
+    return {
+        "days_to_end": days_to_end,
+        "not_found": [policy_id for policy_id in dict.fromkeys(policy_ids) if policy_id not in days_to_end]
+    }
+
+@mcp.tool(name="Get_policies_expiring_within",
+          description="Retrieves policies that end within the given number of days from today, soonest first, with the days until each ends. has_more is true if more than limit policies match.")
+async def get_expiring_policies(days: int = 30, limit: int = DEFAULT_PAGE_SIZE):
+    await ensure_fresh_sample_data()
+    today = date.today()
+    if days < 0:
+        raise ToolError("days must not be negative")
+    # today + days must still be a valid date.
+    max_days = (date.max - today).days
+    if days > max_days:
+        raise ToolError(f"days must be at most {max_days}")
+    _check_page_size(limit, "limit")
+    expiring = await get_policies_expiring_within(days, today, limit + 1)
+    return {
+        "policies": [{"policy": policy, "days_to_end": days_to_end} for policy, days_to_end in expiring[:limit]],
+        "has_more": len(expiring) > limit
+    }
+
+@mcp.tool(name="Get_premium_summary_by_state",
+          description="Policy count and total premium for each customer state.")
+async def get_state_premium_summary():
+    await ensure_fresh_sample_data()
+    return await get_premium_summary_by_state()
+
+@mcp.tool(name="Get_premium_summary_by_product",
+          description="Policy count and total premium for each product.")
+async def get_product_premium_summary():
+    await ensure_fresh_sample_data()
+    return await get_premium_summary_by_product()
+
+@mcp.tool(name="Get_premium_summary_by_state_and_product",
+          description="Policy count and total premium for each combination of customer state and product. Optionally restrict to one state and/or one product.")
+async def get_state_product_premium_summary(state: Optional[str] = None, product: Optional[str] = None):
+    await ensure_fresh_sample_data()
+    return await get_premium_summary_by_state_and_product(state, product)
+
 async def startup():
     """Initialize database on startup"""
-    await init_database()
-    await init_sample_data()
+    configure_entity_caches(ENTITY_CACHE_SIZE, ENTITY_CACHE_TTL)
+    configure_slow_query_log(float(SLOW_QUERY_MS) if SLOW_QUERY_MS else None)
+    configure_database(DATABASE_MODE, SNAPSHOT_INTERVAL, SNAPSHOT_DURABILITY)
+    configure_tool_admission(TOOL_CONCURRENCY, TOOL_QUEUE_SIZE,
+                             {name: LISTING_TOOL_CONCURRENCY for name in LISTING_TOOLS})
+    if SAMPLE_CUSTOMERS:
+        configure_sample_data(GeneratorSettings(int(SAMPLE_CUSTOMERS), SAMPLE_POLICIES_PER_CUSTOMER, SAMPLE_SEED))
+    await prepare_database(DB_POOL_SIZE, TEMPLATE_DATABASE)
+
 
+async def serve():
+    """Run startup and the SSE server on one event loop so the pool is shared."""
+    await startup()
+    try:
+        await mcp.run_sse_async()
+    finally:
+        await close_database()
 
 
 if __name__ == "__main__":
     import asyncio
-    asyncio.run(startup())
-    mcp.run(transport="sse")
+    asyncio.run(serve())
@@ -0,0 +1,21 @@
+import os
+import shutil
+import tempfile
+import unittest
+from data import util
+
+
+class DatabaseTestCase(unittest.IsolatedAsyncioTestCase):
+    """Points the data layer at a fresh database file for each test."""
+
+    async def asyncSetUp(self):
+        self.directory = tempfile.mkdtemp(prefix="insurance-test-")
+        self.saved_path = util.DATABASE_PATH
+        util.DATABASE_PATH = os.path.join(self.directory, "insurance.db")
+
+    async def asyncTearDown(self):
+        await util.close_database()
+        util.configure_database()
+        util.configure_sample_data()
+        util.DATABASE_PATH = self.saved_path
+        shutil.rmtree(self.directory, ignore_errors=True)
@@ -0,0 +1,60 @@
+import asyncio
+import unittest
+from data.admission import ConcurrencyLimit, Coalescer, Overloaded
+
+
+class ConcurrencyLimitTest(unittest.IsolatedAsyncioTestCase):
+
+    async def test_rejects_once_the_queue_is_full(self):
+        limit = ConcurrencyLimit(1, 1)
+        await limit.acquire()
+        waiter = asyncio.ensure_future(limit.acquire())
+        await asyncio.sleep(0)
+        with self.assertRaises(Overloaded):
+            await limit.acquire()
+        limit.release()
+        await waiter
+        self.assertEqual((limit.running, limit.waiting), (1, 0))
+
+    async def test_zero_max_waiting_queues_every_caller(self):
+        limit = ConcurrencyLimit(1, 0)
+        await limit.acquire()
+        waiters = [asyncio.ensure_future(limit.acquire()) for _ in range(10)]
+        await asyncio.sleep(0)
+        self.assertEqual(limit.waiting, 10)
+        for waiter in waiters:
+            limit.release()
+            await waiter
+        limit.release()
+        self.assertEqual((limit.running, limit.waiting), (0, 0))
+
+    async def test_cancelled_waiter_gives_up_its_place(self):
+        limit = ConcurrencyLimit(1, 5)
+        await limit.acquire()
+        cancelled = asyncio.ensure_future(limit.acquire())
+        waiter = asyncio.ensure_future(limit.acquire())
+        await asyncio.sleep(0)
+        cancelled.cancel()
+        await asyncio.sleep(0)
+        limit.release()
+        await waiter
+        self.assertEqual((limit.running, limit.waiting), (1, 0))
+
+
+class CoalescerTest(unittest.IsolatedAsyncioTestCase):
+
+    async def test_identical_calls_share_one_run(self):
+        coalescer = Coalescer()
+        calls = 0
+
+        async def call():
+            nonlocal calls
+            calls += 1
+            await asyncio.sleep(0.01)
+            return "result"
+
+        results = await asyncio.gather(*(coalescer.run("key", call) for _ in range(5)))
+        self.assertEqual(calls, 1)
+        self.assertEqual([shared for _, shared in results], [False, True, True, True, True])
+        await coalescer.run("key", call)
+        self.assertEqual(calls, 2)
@@ -0,0 +1,46 @@
+import unittest
+from data.cache import EntityCache
+
+
+class Clock:
+
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+class EntityCacheTest(unittest.TestCase):
+
+    def setUp(self):
+        self.clock = Clock()
+        self.cache = EntityCache(max_size=2, ttl=10, clock=self.clock)
+
+    def test_evicts_the_least_recently_used_entry(self):
+        self.cache.put(1, "one")
+        self.cache.put(2, "two")
+        self.assertEqual(self.cache.get(1), "one")
+        self.cache.put(3, "three")
+        self.assertIsNone(self.cache.get(2))
+        self.assertEqual((self.cache.get(1), self.cache.get(3)), ("one", "three"))
+        self.assertEqual(self.cache.stats()["evictions"], 1)
+
+    def test_entries_expire_after_the_ttl(self):
+        self.cache.put(1, "one")
+        self.clock.now = 9.9
+        self.assertEqual(self.cache.get(1), "one")
+        self.clock.now = 10
+        self.assertIsNone(self.cache.get(1))
+        self.assertEqual(self.cache.stats()["size"], 0)
+
+    def test_put_from_before_an_invalidation_is_ignored(self):
+        # A read started, then a write invalidated the key before the read
+        # finished and tried to cache what it had read.
+        version = self.cache.version
+        self.cache.invalidate(1)
+        self.cache.put(1, "stale", version)
+        self.assertIsNone(self.cache.get(1))
+
+        self.cache.put(1, "fresh", self.cache.version)
+        self.assertEqual(self.cache.get(1), "fresh")
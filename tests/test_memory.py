@@ -0,0 +1,29 @@
+import sqlite3
+from contextlib import closing
+from data import util, prepare_database, close_database, get_customer_by_id, configure_database
+from tests.support import DatabaseTestCase
+
+
+class MemoryModeTest(DatabaseTestCase):
+
+    async def test_starts_from_a_wal_database(self):
+        await prepare_database(2)
+        await close_database()
+        with closing(sqlite3.connect(util.DATABASE_PATH)) as db:
+            self.assertEqual(db.execute("PRAGMA journal_mode").fetchone()[0], "wal")
+
+        configure_database("memory", 0)
+        await prepare_database(2)
+        customer = await get_customer_by_id(1)
+        self.assertEqual(customer.name, "John Smith")
+
+    async def test_shutdown_snapshot_is_written_to_disk(self):
+        configure_database("memory", 0)
+        await prepare_database(2)
+        async def rename(db):
+            await db.execute("UPDATE customers SET name = 'Renamed' WHERE id = 1")
+        await util.write(rename)
+        await close_database()
+
+        with closing(sqlite3.connect(util.DATABASE_PATH)) as db:
+            self.assertEqual(db.execute("SELECT name FROM customers WHERE id = 1").fetchone()[0], "Renamed")
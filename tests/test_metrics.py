@@ -0,0 +1,38 @@
+from datetime import date
+from data import (prepare_database, get_customer_by_id, get_customers_page_projection, get_customer_overview,
+                  search_customers, update_customer)
+from data.metrics import QUERY_ROWS, configure_slow_query_log, slow_query_logger
+from tests.support import DatabaseTestCase
+
+
+class QueryRowsTest(DatabaseTestCase):
+
+    async def test_named_tuple_results_count_their_rows(self):
+        await prepare_database(1)
+        before = QUERY_ROWS.value("get_customers_page_projection")
+        await get_customers_page_projection(0, 10, ["name"])
+        self.assertEqual(QUERY_ROWS.value("get_customers_page_projection") - before, 10)
+
+        before = QUERY_ROWS.value("get_customer_overview")
+        overview = await get_customer_overview(2, date.today())
+        self.assertEqual(QUERY_ROWS.value("get_customer_overview") - before, len(overview.policies))
+
+
+class SlowQueryLogTest(DatabaseTestCase):
+
+    async def asyncTearDown(self):
+        configure_slow_query_log(None)
+        await super().asyncTearDown()
+
+    async def test_log_leaves_out_customer_details(self):
+        await prepare_database(1)
+        customer = await get_customer_by_id(1)
+        configure_slow_query_log(0)
+        with self.assertLogs(slow_query_logger) as logs:
+            await search_customers(customer.name, limit=5)
+            await update_customer(1, customer)
+        output = "\n".join(logs.output)
+        self.assertIn("search_customers(<str>, limit=5)", output)
+        self.assertIn("update_customer(1, <Customer>)", output)
+        self.assertNotIn(customer.name, output)
+        self.assertNotIn(customer.email, output)
@@ -0,0 +1,128 @@
+import aiosqlite
+from datetime import date
+from decimal import Decimal
+from data import (util, prepare_database, explain_query_plan, migrate, SCHEMA_VERSION, create_customer, update_customer, delete_customer,
+                  get_customer_by_id, create_policy, update_policy, delete_policy)
+from model.customer import Customer
+from model.policy import Policy
+from tests.support import DatabaseTestCase
+
+# The schema of databases created before migrations existed, such as the
+# insurance.db shipped with the first releases: user_version 0 and premiums
+# stored as TEXT.
+UNVERSIONED_SCHEMA = """
+CREATE TABLE customers (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    name TEXT NOT NULL,
+    date_of_birth TEXT NOT NULL,
+    email TEXT UNIQUE NOT NULL,
+    address TEXT NOT NULL,
+    state TEXT NOT NULL,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+CREATE TABLE policies (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    customer_id INTEGER NOT NULL,
+    start_date TEXT NOT NULL,
+    end_date TEXT NOT NULL,
+    product TEXT NOT NULL,
+    premium TEXT NOT NULL,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    FOREIGN KEY (customer_id) REFERENCES customers (id)
+);
+CREATE TABLE sample_data_log (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    generation_date TEXT NOT NULL,
+    customer_count INTEGER NOT NULL,
+    policy_count INTEGER NOT NULL,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+INSERT INTO customers (name, date_of_birth, email, address, state)
+VALUES ('John Smith', '1985-03-15', 'john@example.com', '1 Main St', 'California');
+INSERT INTO policies (customer_id, start_date, end_date, product, premium) VALUES
+    (1, '2025-09-09', '2026-09-08', 'bicycle', '450.00'),
+    (1, '2025-08-25', '2026-08-24', 'pet', '19.99'),
+    (1, '2025-07-01', '2026-06-30', 'pet', '0.1');
+"""
+
+
+class MigrationTest(DatabaseTestCase):
+
+    async def test_upgrades_a_database_with_text_premiums(self):
+        async with aiosqlite.connect(util.DATABASE_PATH) as db:
+            await db.executescript(UNVERSIONED_SCHEMA)
+            self.assertEqual(await migrate(db), SCHEMA_VERSION)
+
+            cursor = await db.execute("PRAGMA user_version")
+            self.assertEqual((await cursor.fetchone())[0], SCHEMA_VERSION)
+            cursor = await db.execute("SELECT id, premium_cents FROM policies ORDER BY id")
+            self.assertEqual(await cursor.fetchall(), [(1, 45000), (2, 1999), (3, 10)])
+            cursor = await db.execute("SELECT name FROM pragma_table_info('policies')")
+            self.assertNotIn(("premium",), await cursor.fetchall())
+            for index, columns in (("idx_policies_customer_id", [("customer_id",), ("premium_cents",)]),
+                                   ("idx_policies_end_date", [("end_date",)])):
+                cursor = await db.execute("SELECT name FROM pragma_index_info(?) ORDER BY seqno", (index,))
+                self.assertEqual(await cursor.fetchall(), columns)
+            cursor = await db.execute("SELECT product, policy_count, premium_cents FROM premium_summary ORDER BY product")
+            self.assertEqual(await cursor.fetchall(), [("bicycle", 1, 45000), ("pet", 2, 2009)])
+
+
+class QueryPlanTest(DatabaseTestCase):
+
+    async def assert_uses_index(self, index: str, sql: str, parameters=()):
+        async with util.get_database() as db:
+            plan = await explain_query_plan(db, sql, parameters)
+        self.assertTrue(any(index in step for step in plan), plan)
+
+    async def test_lookups_use_their_indexes(self):
+        await prepare_database(1)
+        await self.assert_uses_index("idx_customers_state", "SELECT id FROM customers WHERE state = ?", ("Ohio",))
+        await self.assert_uses_index("idx_policies_customer_id",
+                                     "SELECT id, premium_cents FROM policies WHERE customer_id = ?", (1,))
+        await self.assert_uses_index("idx_policies_end_date",
+                                     "SELECT id FROM policies WHERE end_date BETWEEN ? AND ? ORDER BY end_date, id",
+                                     ("2026-01-01", "2026-02-01"))
+
+
+class PremiumSummaryTest(DatabaseTestCase):
+
+    async def assert_summary_matches_policies(self):
+        async with util.get_database() as db:
+            cursor = await db.execute(
+                "SELECT state, product, policy_count, premium_cents FROM premium_summary ORDER BY state, product")
+            summary = await cursor.fetchall()
+            cursor = await db.execute("""
+                SELECT c.state, p.product, COUNT(*), SUM(p.premium_cents)
+                FROM policies p JOIN customers c ON c.id = p.customer_id
+                GROUP BY c.state, p.product ORDER BY c.state, p.product
+            """)
+            self.assertEqual(summary, await cursor.fetchall())
+
+    async def test_triggers_keep_summary_in_step_with_writes(self):
+        await prepare_database(1)
+        await self.assert_summary_matches_policies()
+
+        customer = Customer(id=0, name="Ana Ruiz", date_of_birth=date(1991, 11, 30), email="ana@example.com",
+                            address="3 Hill Ave", state="Nowhere")
+        customer_id = await create_customer(customer)
+        policy = Policy(id=0, customer_id=customer_id, start_date=date(2026, 1, 1), end_date=date(2026, 12, 31),
+                        product="Pet", premium=Decimal("12.34"))
+        policy_id = await create_policy(policy)
+        await create_policy(policy.model_copy(update={"product": "Boat"}))
+        await self.assert_summary_matches_policies()
+
+        await update_policy(policy_id, policy.model_copy(update={"premium": Decimal("50.00")}))
+        await self.assert_summary_matches_policies()
+        await update_policy(policy_id, policy.model_copy(update={"customer_id": 1, "product": "Travel"}))
+        await self.assert_summary_matches_policies()
+
+        await update_customer(customer_id, customer.model_copy(update={"state": "Elsewhere"}))
+        await self.assert_summary_matches_policies()
+        moved = await get_customer_by_id(1)
+        await update_customer(1, moved.model_copy(update={"state": "Nowhere"}))
+        await self.assert_summary_matches_policies()
+
+        await delete_policy(policy_id)
+        await self.assert_summary_matches_policies()
+        await delete_customer(customer_id)
+        await self.assert_summary_matches_policies()
@@ -0,0 +1,112 @@
+import asyncio
+import os
+import sqlite3
+import threading
+from contextlib import closing
+from datetime import date, timedelta
+from data import util, prepare_database, close_database, configure_sample_data, GeneratorSettings, get_policy_by_id, ensure_fresh_sample_data
+from tests.support import DatabaseTestCase
+
+SETTINGS = GeneratorSettings(50, 2, 7)
+
+
+class TemplateRestoreTest(DatabaseTestCase):
+
+    async def build_template(self) -> str:
+        database = util.DATABASE_PATH
+        util.DATABASE_PATH = template = os.path.join(self.directory, "template.db")
+        configure_sample_data(SETTINGS)
+        await prepare_database(1)
+        await close_database()
+        util.DATABASE_PATH = database
+        return template
+
+    async def count_customers(self) -> int:
+        async with util.get_database() as db:
+            cursor = await db.execute("SELECT COUNT(*) FROM customers")
+            return (await cursor.fetchone())[0]
+
+    async def test_restores_over_a_database_built_with_other_settings(self):
+        template = await self.build_template()
+        configure_sample_data()
+        await prepare_database(1)
+        self.assertEqual(await self.count_customers(), 13)
+        await close_database()
+
+        configure_sample_data(SETTINGS)
+        with self.assertLogs("insurance_mcp", "INFO") as logs:
+            await prepare_database(1, template)
+        self.assertIn("Restored", logs.output[0])
+        self.assertEqual(await self.count_customers(), 50)
+
+    async def test_skips_the_template_when_the_data_is_current(self):
+        template = await self.build_template()
+        configure_sample_data(SETTINGS)
+        await prepare_database(1, template)
+        await close_database()
+
+        with self.assertLogs("insurance_mcp", "INFO") as logs:
+            self.assertFalse(await util.restore_database(template))
+        self.assertIn("Not restoring", logs.output[0])
+
+
+class FreshnessTest(DatabaseTestCase):
+
+    async def test_day_rollover_drops_cached_entities(self):
+        await prepare_database(1)
+        cached = await get_policy_by_id(1)
+        # Another process refreshed the data for the new day before us.
+        with closing(sqlite3.connect(util.DATABASE_PATH)) as db, db:
+            db.execute("UPDATE policies SET end_date = '2099-01-01' WHERE id = 1")
+        util._fresh_for = date.today() - timedelta(days=1)
+
+        await ensure_fresh_sample_data()
+        policy = await get_policy_by_id(1)
+        self.assertNotEqual(cached.end_date, policy.end_date)
+        self.assertEqual(policy.end_date, date(2099, 1, 1))
+
+    async def test_freshness_check_during_startup_does_not_deadlock(self):
+        await prepare_database(1)
+        await close_database()
+        with closing(sqlite3.connect(util.DATABASE_PATH)) as db, db:
+            db.execute("UPDATE sample_data_log SET generation_date = ?", ((date.today() - timedelta(days=1)).isoformat(),))
+        # Both need the in-process lock and the lock file; taken in opposite
+        # orders each would wait on the other forever.
+        await asyncio.wait_for(asyncio.gather(prepare_database(1), ensure_fresh_sample_data()), 30)
+        self.assertEqual(util._fresh_for, date.today())
+
+    async def test_day_rollover_moves_the_data_forward(self):
+        await prepare_database(1)
+        policy = await get_policy_by_id(1)
+        # A row that would not survive regenerating the data.
+        with closing(sqlite3.connect(util.DATABASE_PATH)) as db, db:
+            db.execute("UPDATE customers SET name = 'Kept' WHERE id = 1")
+            db.execute("UPDATE sample_data_log SET generation_date = ?",
+                       ((date.today() - timedelta(days=1)).isoformat(),))
+            db.execute("UPDATE policies SET start_date = date(start_date, '-1 days'), "
+                       "end_date = date(end_date, '-1 days')")
+        util._fresh_for = date.today() - timedelta(days=1)
+
+        await ensure_fresh_sample_data()
+        self.assertEqual(await get_policy_by_id(1), policy)
+        async with util.get_database() as db:
+            cursor = await db.execute("SELECT name FROM customers WHERE id = 1")
+            self.assertEqual((await cursor.fetchone())[0], "Kept")
+
+
+class DatabaseLockTest(DatabaseTestCase):
+
+    async def test_cancelled_waiter_leaves_no_thread_behind(self):
+        threads = set(threading.enumerate())
+        async with util.database_lock():
+            waiter = asyncio.ensure_future(util.database_lock().__aenter__())
+            await asyncio.sleep(0.2)
+            waiter.cancel()
+            with self.assertRaises(asyncio.CancelledError):
+                await waiter
+            # A thread blocked on the lock could not be stopped, and would
+            # go on to lock whatever file reused the closed fd.
+            self.assertLessEqual(set(threading.enumerate()), threads)
+        async with asyncio.timeout(5):
+            async with util.database_lock():
+                pass
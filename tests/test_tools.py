@@ -0,0 +1,38 @@
+from datetime import date
+from mcp.server.fastmcp.exceptions import ToolError
+import main
+from data import prepare_database
+from tests.support import DatabaseTestCase
+
+
+class NotFoundTest(DatabaseTestCase):
+
+    async def asyncSetUp(self):
+        await super().asyncSetUp()
+        await prepare_database(1)
+
+    async def assert_not_found(self, tool: str, arguments: dict, message: str):
+        with self.assertRaises(ToolError) as raised:
+            await main.mcp.call_tool(tool, arguments)
+        self.assertIn(message, str(raised.exception))
+
+    async def test_unknown_ids_report_not_found(self):
+        await self.assert_not_found("Get_customer_by_ID", {"customer_id": 999}, "Customer not found")
+        await self.assert_not_found("Get_customer_overview", {"customer_id": 999}, "Customer not found")
+        await self.assert_not_found("Calculate_total_customer_premium", {"customer_id": 999}, "Customer not found")
+        await self.assert_not_found("Calculate_days_until_policy_end", {"policy_id": 999}, "Policy not found")
+
+
+class ExpiringPoliciesTest(DatabaseTestCase):
+
+    async def asyncSetUp(self):
+        await super().asyncSetUp()
+        await prepare_database(1)
+
+    async def test_rejects_days_beyond_the_last_date(self):
+        with self.assertRaises(ToolError) as raised:
+            await main.mcp.call_tool("Get_policies_expiring_within", {"days": 10 ** 8})
+        self.assertIn("days must be at most", str(raised.exception))
+
+        max_days = (date.max - date.today()).days
+        await main.mcp.call_tool("Get_policies_expiring_within", {"days": max_days})
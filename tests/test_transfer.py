@@ -0,0 +1,59 @@
+import io
+from data import (util, prepare_database, import_customers, import_policies, read_records, ensure_fresh_sample_data,
+                  search_customers)
+from tests.support import DatabaseTestCase
+
+CUSTOMERS = """name,date_of_birth,email,address,state
+Ghislaine Hart,1980-02-01,gh@example.com,1 Quay St,Ohio
+Gus Holt,1975-07-09,gus@example.com,2 Mill Rd,Iowa
+Ana Ruiz,1991-11-30,ana@example.com,3 Hill Ave,Texas
+"""
+
+
+class ImportTest(DatabaseTestCase):
+
+    async def count_customers(self) -> int:
+        async with util.get_database() as db:
+            cursor = await db.execute("SELECT COUNT(*) FROM customers")
+            return (await cursor.fetchone())[0]
+
+    async def test_imported_data_is_not_replaced_by_sample_data(self):
+        await util.open_database(1)
+        await util.init_database()
+        report = await import_customers(read_records(io.StringIO(CUSTOMERS), "csv"))
+        self.assertEqual((report.inserted, report.failed), (3, 0))
+        await util.close_database()
+
+        await prepare_database(2)
+        self.assertEqual(await self.count_customers(), 3)
+        self.assertEqual({customer.name for customer in await search_customers("g h")},
+                         {"Ghislaine Hart", "Gus Holt"})
+
+        # As on the next day's first call.
+        util._fresh_for = None
+        await ensure_fresh_sample_data()
+        self.assertEqual(await self.count_customers(), 3)
+
+    async def test_out_of_range_numbers_fail_only_their_row(self):
+        await util.open_database(1)
+        await util.init_database()
+        customers = "\n".join([
+            '{"name": "Ana Ruiz", "date_of_birth": "1991-11-30", "email": "ana@example.com", "address": "3 Hill Ave", "state": "Texas"}',
+            '{"id": 100000000000000000000, "name": "Big Id", "date_of_birth": "1990-01-01", "email": "big@example.com", "address": "1 Big St", "state": "Ohio"}',
+            '{"name": "Gus Holt", "date_of_birth": "1975-07-09", "email": "gus@example.com", "address": "2 Mill Rd", "state": "Iowa"}',
+        ])
+        report = await import_customers(read_records(io.StringIO(customers), "ndjson"))
+        self.assertEqual((report.inserted, report.failed), (2, 1))
+        self.assertEqual(report.errors[0].line, 2)
+
+        policy = '"start_date": "2026-01-01", "end_date": "2026-12-31", "product": "Pet"'
+        policies = "\n".join([
+            f'{{"customer_email": "ana@example.com", {policy}, "premium": "12.50"}}',
+            f'{{"customer_email": "ana@example.com", {policy}, "premium": "1e30"}}',
+            f'{{"customer_id": 100000000000000000000, {policy}, "premium": "1.00"}}',
+            f'{{"customer_email": "gus@example.com", {policy}, "premium": "1e999999999"}}',
+            f'{{"customer_email": "gus@example.com", {policy}, "premium": "30"}}',
+        ])
+        report = await import_policies(read_records(io.StringIO(policies), "ndjson"))
+        self.assertEqual((report.inserted, report.failed), (2, 3))
+        self.assertEqual([error.line for error in report.errors], [2, 3, 4])
@@ -0,0 +1,30 @@
+import asyncio
+from data import util, prepare_database
+from data.writer import WRITE_BATCH_SIZE
+from tests.support import DatabaseTestCase
+
+
+class GroupCommitTest(DatabaseTestCase):
+
+    async def test_failing_write_does_not_roll_back_the_batch(self):
+        await prepare_database(1)
+
+        def insert(state: str, fail: bool = False):
+            async def operation(db):
+                await db.execute("""
+                    INSERT INTO customers (name, date_of_birth, email, address, state)
+                    VALUES ('Batch', '1990-01-01', ?, '1 Batch St', ?)
+                """, (f"{state}@example.com", state))
+                if fail:
+                    raise ValueError("rejected")
+            return operation
+
+        batches = WRITE_BATCH_SIZE.count()
+        results = await asyncio.gather(util.write(insert("First")), util.write(insert("Failed", fail=True)),
+                                       util.write(insert("Last")), return_exceptions=True)
+        self.assertEqual(WRITE_BATCH_SIZE.count() - batches, 1)
+        self.assertIsInstance(results[1], ValueError)
+
+        async with util.get_database() as db:
+            cursor = await db.execute("SELECT state FROM customers WHERE name = 'Batch' ORDER BY id")
+            self.assertEqual([row[0] for row in await cursor.fetchall()], ["First", "Last"])